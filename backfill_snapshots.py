@@ -0,0 +1,40 @@
+"""
+Historical Snapshot Backfill Script
+
+Computes snapshots for every trading date in the local market data in one pass
+and writes them to data/snapshots.db. No network access is needed.
+
+Usage:
+    python backfill_snapshots.py [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--workers N]
+"""
+
+import sys
+import os
+import argparse
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from data import backfill_snapshots
+from datetime import datetime
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill historical snapshots from local market data.")
+    parser.add_argument('--start', type=parse_date, help="First date to backfill (inclusive)")
+    parser.add_argument('--end', type=parse_date, help="Last date to backfill (inclusive)")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    print(f"=== Snapshot Backfill - {datetime.now()} ===")
+    try:
+        count = backfill_snapshots(start_date=args.start, end_date=args.end, workers=args.workers)
+        print(f"✅ Backfilled {count} dates")
+    except Exception as e:
+        print(f"❌ Error backfilling snapshots: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
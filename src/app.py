@@ -1,9 +1,12 @@
 
 import streamlit as st
 import pandas as pd
-from data import get_monitor_data
-from storage import load_metadata, save_metadata, load_settings, save_settings, get_available_snapshot_dates
+from cache import monitor_data, cached_snapshot, cached_snapshot_dates
+from storage import update_themes, load_settings, save_settings
 from datetime import datetime
+from leaderboard import group_leaderboards, ThemeAggregator
+from themes import ThemeIndex, stage_theme_edits, with_themes
+from styling import TABLE_GRADIENTS, LEADERBOARD_GRADIENTS, cached_color_buckets, style_frame, paginate
 
 st.set_page_config(page_title="US Stock Monitor", layout="wide", initial_sidebar_state="collapsed")
 
@@ -36,7 +39,7 @@ with st.sidebar:
     mode = st.radio("Select Mode:", ["Live Scan", "Historical View"], index=0)
     
     if mode == "Historical View":
-        available_dates = get_available_snapshot_dates()
+        available_dates = cached_snapshot_dates()
         if available_dates:
             selected_date = st.selectbox("Select Date:", available_dates)
             if st.button("Load Snapshot"):
@@ -71,9 +74,6 @@ with col1:
 if 'stock_data' not in st.session_state:
     st.session_state['stock_data'] = pd.DataFrame()
 
-if 'edited_data' not in st.session_state:
-    st.session_state['edited_data'] = pd.DataFrame()
-
 # Load historical data if in historical mode
 if st.session_state.get('historical_mode', False):
     # Check if we need to load/reload data
@@ -86,17 +86,15 @@ if st.session_state.get('historical_mode', False):
             need_reload = True
         
         if need_reload:
-            with st.spinner(f"Calculating snapshot for {st.session_state['selected_date']}..."):
-                # Calculate metrics on-demand for the selected date
-                df = get_monitor_data(force_refresh_metadata=False, as_of_date=st.session_state['selected_date'])
+            with st.spinner(f"Loading snapshot for {st.session_state['selected_date']}..."):
+                # Saved snapshot, or calculated from local data (no network, no writes)
+                df = cached_snapshot(st.session_state['selected_date'])
                 if not df.empty:
-                    # Apply current column order
-                    _cols = [c for c in st.session_state['col_order'] if c in df.columns]
-                    _other = [c for c in df.columns if c not in _cols]
-                    df = df[_cols + _other]
-                    
                     st.session_state['stock_data'] = df
-                    st.session_state['edited_data'] = df.copy()
+                    st.session_state['theme_overrides'] = {}
+                    st.session_state['staged_theme_edits'] = {}
+                    st.session_state['theme_index'] = ThemeIndex.from_frame(df)
+                    st.session_state['theme_aggregator'] = ThemeAggregator(df)
                     st.session_state['loaded_snapshot_date'] = st.session_state['selected_date']
                 else:
                     st.warning(f"No data found for {st.session_state['selected_date']}. Please select another date or run a live scan.")
@@ -107,20 +105,19 @@ if st.session_state.get('historical_mode', False):
 
 if run_btn:
     with st.spinner("Fetching/Updating market data..."):
-        df = get_monitor_data(force_refresh_metadata=force_refresh)
-        
-        # Apply current column order if available
-        _cols = [c for c in st.session_state['col_order'] if c in df.columns]
-        _other = [c for c in df.columns if c not in _cols]
-        df = df[_cols + _other]
+        df = monitor_data(force_refresh_metadata=force_refresh)
         
         st.session_state['stock_data'] = df
-        st.session_state['edited_data'] = df.copy()
+        st.session_state['theme_overrides'] = {}
+        st.session_state['staged_theme_edits'] = {}
+        st.session_state['theme_index'] = ThemeIndex.from_frame(df)
+        st.session_state['theme_aggregator'] = ThemeAggregator(df)
         st.success(f"✅ Data updated successfully! ({len(df)} stocks)")
 
 if not st.session_state['stock_data'].empty:
-    # Use the session_state for display and editing
-    display_df = st.session_state['stock_data'].copy()
+    # The scan frame is shared by all sessions (cache_resource) and never modified;
+    # this session's theme edits are a sparse overlay on top of it
+    display_df = with_themes(st.session_state['stock_data'], st.session_state.get('theme_overrides'))
     # Exclude pinned columns from draggable order
     pinned = ["Ticker", "Name"]
     available_cols = [c for c in st.session_state['col_order'] if c in display_df.columns and c not in pinned]
@@ -130,61 +127,6 @@ if not st.session_state['stock_data'].empty:
     st.header("Strategic Leaderboards")
     tab_theme, tab_sector, tab_industry, tab_sub = st.tabs(["Your Themes", "Sector", "Industry", "Sub-Industry"])
 
-    def calculate_group_performance(data, group_col, is_list=False):
-        rows = []
-        for _, row in data.iterrows():
-            val = row.get(group_col)
-            if pd.isna(val) or val == "":
-                continue
-            
-            groups = val.split(', ') if is_list else [val]
-            for g in groups:
-                rows.append({
-                    'Name': g,
-                    'YTD Performance (%)': row['YTD Performance (%)'],
-                    '5-Day Performance (%)': row.get('5-Day Performance (%)', 0.0),
-                    'Turnover Ratio': row.get('Turnover Ratio', 0.0),
-                    'Latest Turnover': row.get('Latest Turnover', 0.0)
-                })
-        
-        pdf = pd.DataFrame(rows)
-        if pdf.empty:
-            return pd.DataFrame()
-            
-        leaderboard = pdf.groupby('Name').agg({
-            'YTD Performance (%)': 'mean',
-            '5-Day Performance (%)': 'mean',
-            'Turnover Ratio': 'mean',
-            'Latest Turnover': 'mean',
-            'Name': 'count'
-        }).rename(columns={'Name': 'Count'})
-        
-        leaderboard['Latest Turnover'] = leaderboard['Latest Turnover'] / 1_000_000
-        
-        # Calculate Ranks for the groups
-        leaderboard['Rank YTD%'] = leaderboard['YTD Performance (%)'].rank(ascending=False, method='min')
-        leaderboard['Rank 5D%'] = leaderboard['5-Day Performance (%)'].rank(ascending=False, method='min')
-        leaderboard['Rank Turnover Ratio'] = leaderboard['Turnover Ratio'].rank(ascending=False, method='min')
-        leaderboard['Rank 20d Vol'] = leaderboard['Latest Turnover'].rank(ascending=False, method='min')
-        
-        # Overall Rank for Categories
-        leaderboard['Overall Score'] = (leaderboard['Rank YTD%'] + leaderboard['Rank 5D%'] + 
-                                       leaderboard['Rank Turnover Ratio'] + leaderboard['Rank 20d Vol']) / 4
-        leaderboard['Overall Rank'] = leaderboard['Overall Score'].rank(ascending=True, method='min')
-        
-        # Sort by Overall Rank by default
-        leaderboard = leaderboard.drop(columns=['Overall Score']).sort_values(by='Overall Rank')
-        
-        # Reorder columns: Name, Overall Rank, then the rest
-        cols = leaderboard.columns.tolist()
-        if 'Overall Rank' in cols:
-            cols.remove('Overall Rank')
-            # Insert Overall Rank right after the index (Name is the index)
-            cols.insert(0, 'Overall Rank')
-            leaderboard = leaderboard[cols]
-        
-        return leaderboard
-
     # Initialize filter states if not present
     if 'sel_themes' not in st.session_state: st.session_state['sel_themes'] = []
     if 'sel_sectors' not in st.session_state: st.session_state['sel_sectors'] = []
@@ -196,22 +138,9 @@ if not st.session_state['stock_data'].empty:
             st.info(f"No {title} data available.")
             return
 
-        styled = leaderboard.style.background_gradient(
-            subset=['YTD Performance (%)', '5-Day Performance (%)'], 
-            cmap='RdYlGn'
-        ).background_gradient(
-            subset=['Turnover Ratio'],
-            cmap='Oranges',
-            vmin=0.5, vmax=2.5
-        ).background_gradient(
-            subset=['Latest Turnover'],
-            cmap='Blues',
-            vmin=0, vmax=500
-        ).background_gradient(
-            subset=['Overall Rank'],
-            cmap='RdYlGn_r',
-            vmin=1, vmax=10
-        ).format(precision=2)
+        # Colours precomputed per leaderboard (cached with it), not re-derived by Styler
+        styled = style_frame(leaderboard, cached_color_buckets(leaderboard, LEADERBOARD_GRADIENTS),
+                             LEADERBOARD_GRADIENTS).format(precision=2)
 
         event = st.dataframe(
             styled,
@@ -264,14 +193,21 @@ if not st.session_state['stock_data'].empty:
                 st.session_state[last_key] = None
                 st.rerun()
 
+    # Sector/industry boards depend only on the shared scan (cached); the theme board
+    # is maintained incrementally from this session's theme edits
+    leaderboards = group_leaderboards(st.session_state['stock_data'])
+    theme_aggregator = st.session_state.get('theme_aggregator')
+    if theme_aggregator is None or not theme_aggregator.matches(display_df):
+        theme_aggregator = ThemeAggregator(display_df)
+        st.session_state['theme_aggregator'] = theme_aggregator
     with tab_theme:
-        display_styled_leaderboard(calculate_group_performance(display_df, 'Themes', is_list=True), "User Theme", "sel_themes")
+        display_styled_leaderboard(theme_aggregator.leaderboard(), "User Theme", "sel_themes")
     with tab_sector:
-        display_styled_leaderboard(calculate_group_performance(display_df, 'GICS Sector'), "Sector", "sel_sectors")
+        display_styled_leaderboard(leaderboards['GICS Sector'], "Sector", "sel_sectors")
     with tab_industry:
-        display_styled_leaderboard(calculate_group_performance(display_df, 'GICS Industry'), "Industry", "sel_industries")
+        display_styled_leaderboard(leaderboards['GICS Industry'], "Industry", "sel_industries")
     with tab_sub:
-        display_styled_leaderboard(calculate_group_performance(display_df, 'GICS Sub-Industry'), "Sub-Industry", "sel_subs")
+        display_styled_leaderboard(leaderboards['GICS Sub-Industry'], "Sub-Industry", "sel_subs")
         
     # Load additional UI settings
     if 'col_widths' not in st.session_state:
@@ -324,22 +260,12 @@ if not st.session_state['stock_data'].empty:
             st.session_state['col_order'] = new_order
             st.session_state['col_widths'] = new_widths
             st.session_state['table_height'] = new_height
-            # Reorder current data in session state
-            df = st.session_state['stock_data']
-            cols = [c for c in new_order if c in df.columns]
-            rem = [c for c in df.columns if c not in cols]
-            st.session_state['stock_data'] = df[cols + rem]
             st.rerun()
 
     # Save Logic
     if st.button("💾 SAVE ALL CHANGES (Themes & UI Config)"):
-        # Save Themes
-        meta_df = load_metadata()
-        for _, row in st.session_state['stock_data'].iterrows():
-            ticker = row['Ticker']
-            theme_val = row['Themes']
-            meta_df.loc[meta_df['Symbol'] == ticker, 'Smart Tags'] = theme_val
-        save_metadata(meta_df)
+        # Save Themes (the session's edits; only values that differ from storage are written)
+        update_themes(st.session_state.get('theme_overrides'))
         
         # Save UI Settings
         st.session_state['settings']['column_order'] = st.session_state['col_order']
@@ -350,11 +276,16 @@ if not st.session_state['stock_data'].empty:
         st.success("Configuration persisted successfully!")
         st.rerun()
 
+    # Theme index over the scan rows; kept in sync with theme edits below
+    theme_index = st.session_state.get('theme_index')
+    if theme_index is None or not theme_index.matches(display_df):
+        theme_index = ThemeIndex.from_frame(display_df)
+        st.session_state['theme_index'] = theme_index
+
     f_col1, f_col2, f_col3, f_col4 = st.columns(4)
     
     with f_col1:
-        all_themes = sorted(list(set([t for themes in display_df['Themes'].dropna() for t in themes.split(', ') if t])))
-        sel_themes = st.multiselect("Filter Theme", all_themes, key="sel_themes")
+        sel_themes = st.multiselect("Filter Theme", theme_index.themes, key="sel_themes")
     with f_col2:
         all_sectors = sorted(display_df['GICS Sector'].dropna().unique())
         sel_sectors = st.multiselect("Filter Sector", all_sectors, key="sel_sectors")
@@ -366,10 +297,10 @@ if not st.session_state['stock_data'].empty:
         sel_subs = st.multiselect("Filter Sub-Industry", all_subs, key="sel_subs")
 
     # Apply Filters
-    filtered_df = display_df.copy()
+    filtered_df = display_df
     if sel_themes:
-        mask = filtered_df['Themes'].apply(lambda x: any(t in x for t in sel_themes) if pd.notna(x) else False)
-        filtered_df = filtered_df[mask]
+        # Exact theme match via the index (positions line up with display_df)
+        filtered_df = filtered_df.iloc[theme_index.lookup(sel_themes)]
     if sel_sectors:
         filtered_df = filtered_df[filtered_df['GICS Sector'].isin(sel_sectors)]
     if sel_industries:
@@ -377,34 +308,23 @@ if not st.session_state['stock_data'].empty:
     if sel_subs:
         filtered_df = filtered_df[filtered_df['GICS Sub-Industry'].isin(sel_subs)]
 
-    # Convert turnover to millions for display
-    # Make a copy to avoid modifying the original session state data
-    filtered_df = filtered_df.copy()
-    filtered_df['Latest Turnover'] = filtered_df['Latest Turnover'] / 1_000_000
-    filtered_df['Avg Daily Turnover (20d)'] = filtered_df['Avg Daily Turnover (20d)'] / 1_000_000
-
-    # Sort
+    # Sort, then keep only the visible page; everything below touches just those rows
     filtered_df = filtered_df.sort_values(by="Overall Rank", ascending=True)
-    
-    # st.write(f"Showing {len(filtered_df)} stocks. Edit the 'Themes' column below:")
-    
-    # DATA EDITOR with Styling
-    styled_filtered_df = filtered_df.style.background_gradient(
-        subset=['YTD Performance (%)', '5-Day Performance (%)'],
-        cmap='RdYlGn'
-    ).background_gradient(
-        subset=['Turnover Ratio'],
-        cmap='Oranges',
-        vmin=0.5, vmax=3.0
-    ).background_gradient(
-        subset=['Avg Daily Turnover (20d)'],
-        cmap='Blues',
-        vmin=0, vmax=500  # Adjust based on typical values in millions
-    ).background_gradient(
-        subset=['Overall Rank'],
-        cmap='RdYlGn_r', # Reverse because 1 is better
-        vmin=1, vmax=100
-    ).format(precision=2)
+    page_df = paginate(filtered_df, "scan_table")
+
+    # Convert turnover to millions for display
+    # Shallow copy: only the two converted columns are new, the shared data is untouched
+    page_df = page_df.copy(deep=False)
+    page_df['Latest Turnover'] = page_df['Latest Turnover'] / 1_000_000
+    page_df['Avg Daily Turnover (20d)'] = page_df['Avg Daily Turnover (20d)'] / 1_000_000
+    # Theme edits staged but not yet applied are shown over the page, so they are kept
+    # across page, page size and filter changes
+    unstaged_page_df = page_df
+    page_df = with_themes(page_df, st.session_state.get('staged_theme_edits'))
+
+    # DATA EDITOR with Styling (colour buckets computed once per scan, looked up for the page)
+    styled_filtered_df = style_frame(page_df, cached_color_buckets(display_df, TABLE_GRADIENTS),
+                                     TABLE_GRADIENTS).format(precision=2)
 
     # Prepare Column Config with widths
     WIDTH_MAP = {"small": "small", "medium": "medium", "large": "large", "auto": None}
@@ -435,27 +355,50 @@ if not st.session_state['stock_data'].empty:
         "5-Day Performance (%)": st.column_config.NumberColumn("5D %", format="%.2f%%", disabled=True, width=WIDTH_MAP.get(cw.get("5-Day Performance (%)", "auto")))
     }
 
-    edited_df = st.data_editor(
-        styled_filtered_df,
+    # Column order is applied by the editor instead of reordering (copying) the data
+    table_columns = [c for c in st.session_state['col_order'] if c in page_df.columns]
+    table_columns += [c for c in page_df.columns if c not in table_columns]
+
+    @st.fragment
+    def theme_editor(page_df, styled_df, editor_args, theme_index, theme_aggregator):
+        """
+        Editable scan table. An edit reruns only this fragment and is staged in session
+        state; Apply runs the staged edits (from every page) as one batch: a single
+        overlay/index/leaderboard update and rerun.
+        """
+        edited_df = st.data_editor(styled_df, **editor_args)
+        staged = stage_theme_edits(st.session_state.get('staged_theme_edits', {}), page_df, edited_df)
+        st.session_state['staged_theme_edits'] = staged
+        apply_col, info_col = st.columns([1, 4])
+        with apply_col:
+            apply_edits = st.button("✅ Apply Theme Edits", disabled=not staged)
+        with info_col:
+            if staged:
+                st.caption(f"{len(staged)} theme edits staged, kept across pages and filters until applied")
+        if apply_edits and staged:
+            # Record the edits in this session's overlay
+            st.session_state.setdefault('theme_overrides', {}).update(staged)
+            for ticker, theme_val in staged.items():
+                theme_index.update(ticker, theme_val)
+                theme_aggregator.update(ticker, theme_val)
+            st.session_state['staged_theme_edits'] = {}
+            st.toast(f"Applied {len(staged)} theme edits")
+            st.rerun() # Whole app, to update leaderboards immediately
+
+    editor_args = dict(
         column_config=base_config,
+        column_order=table_columns,
         use_container_width=True,
         hide_index=True, 
         height=st.session_state['table_height'],
-        key="theme_editor"
+        key=f"theme_editor_{st.session_state.get('scan_table_page', 1)}"
     )
-    
-    # Save edits back to session state if changed (only in live mode)
-    if not st.session_state.get('historical_mode', False):
-        if not edited_df['Themes'].equals(filtered_df['Themes']):
-            # Merge theme changes back into the main session state
-            main_df = st.session_state['stock_data']
-            for _, row in edited_df.iterrows():
-                ticker = row['Ticker']
-                theme_val = row['Themes']
-                main_df.loc[main_df['Ticker'] == ticker, 'Themes'] = theme_val
-            st.session_state['stock_data'] = main_df
-            st.rerun() # Rerun to update leaderboards immediately
 
+    if st.session_state.get('historical_mode', False):
+        # Snapshots are read-only
+        st.data_editor(styled_filtered_df, **editor_args)
+    else:
+        theme_editor(unstaged_page_df, styled_filtered_df, editor_args, theme_index, theme_aggregator)
 
 else:
     if run_btn:
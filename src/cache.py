@@ -0,0 +1,57 @@
+"""
+Streamlit cache layer shared by app.py and app_cloud.py.
+
+Each cached call is keyed on the version tokens (mtime/size) of the files it
+reads, so all sessions of a server process share one computed result until the
+underlying data changes, and superseded versions age out (max_entries, LRU).
+Group leaderboards are cached by leaderboard.group_leaderboards itself.
+
+Scan and snapshot frames are cache_resource objects: every session gets the same
+frame, not a copy, so callers must treat them as read-only (session edits go in
+an overlay, see themes.with_themes).
+"""
+import datetime
+
+import streamlit as st
+
+from data import update_sources, scan_market_data, load_historical_snapshot
+from storage import (load_metadata, get_available_snapshot_dates,
+                     market_data_version, metadata_version, snapshot_db_version)
+
+CACHE_ENTRIES = 8  # versions/dates kept per cached function
+
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _scan(market_version, meta_version, as_of_date, today):
+    return scan_market_data(load_metadata(), as_of_date)
+
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _snapshot(as_of_date, snapshot_version, market_version, meta_version):
+    return load_historical_snapshot(as_of_date)
+
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _snapshot_dates(market_version):
+    return get_available_snapshot_dates()
+
+
+def cached_scan(as_of_date=None):
+    """scan_market_data over the stored files; recomputed only when they (or the day) change."""
+    return _scan(market_data_version(), metadata_version(), as_of_date, datetime.date.today())
+
+
+def monitor_data(force_refresh_metadata=False):
+    """get_monitor_data: refreshes the sources, then serves the scan from the cache."""
+    update_sources(force_refresh_metadata)
+    return cached_scan()
+
+
+def cached_snapshot(as_of_date):
+    """load_historical_snapshot, shared until the snapshot database or source data change."""
+    return _snapshot(as_of_date, snapshot_db_version(), market_data_version(), metadata_version())
+
+
+def cached_snapshot_dates():
+    """get_available_snapshot_dates, shared until the market data changes."""
+    return _snapshot_dates(market_data_version())
@@ -1,61 +1,166 @@
 
-from storage import load_metadata, save_metadata, load_market_data, save_market_data, get_latest_date
+from storage import (load_metadata, save_metadata, metadata_lock, load_constituents, save_constituents,
+                     load_market_windows, normalize_market_data, append_market_data, load_market_manifest, get_latest_date,
+                     load_market_panel, Panel,
+                     save_snapshots, SNAPSHOT_MIN_HISTORY, load_snapshot_by_date)
 import numpy as np
 import pandas as pd
 import requests
-import yfinance as yf
 import datetime
+import io
 import concurrent.futures
+from metadata_fetcher import fetch_infos
+from downloader import plan_fetches, download_plan, clear_checkpoint as clear_download_checkpoint
+
+# Metric windows (in trading days)
+TURNOVER_WINDOW = 20
+PERF_WINDOW = 5
+
+# Calendar days of history fetched for symbols with no stored bars
+INITIAL_HISTORY_DAYS = 180
 
 # Yahoo Finance can be flaky with 401 errors.
 def fetch_info_with_retry(ticker, retries=2):
-    try:
-        t = yf.Ticker(ticker)
-        # Accessing info can trigger the 401 if not lucky
-        info = t.info
-        if info:
-            return info
-    except Exception:
-        pass
-    return {}
+    """Fetches a single ticker's info with jittered backoff retries. Returns {} if all attempts fail."""
+    results, _ = fetch_infos([ticker], retries=retries, concurrency=1)
+    return results.get(ticker, {})
 
-def get_sp500_tickers():
-    """Retrives S&P 500 tickers, names, and sectors from Wikipedia."""
+SP500_URL = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+SP500_COLUMNS = ['Symbol', 'Security', 'GICS Sector', 'GICS Sub-Industry']
+
+# How long the cached constituent list is used without asking Wikipedia at all
+CONSTITUENTS_TTL_HOURS = 24
+
+def diff_constituents(old_df, new_df):
+    """
+    Structured diff of two constituent lists:
+    {'added': [...], 'removed': [...], 'changed': [...]} where 'changed' lists symbols
+    present in both whose name, sector or sub-industry differ.
+    """
+    old_symbols = set(old_df['Symbol']) if not old_df.empty else set()
+    new_symbols = set(new_df['Symbol']) if not new_df.empty else set()
+    changed = []
+    if old_symbols & new_symbols:
+        cols = [c for c in SP500_COLUMNS if c in old_df.columns and c in new_df.columns]
+        both = pd.merge(old_df[cols], new_df[cols], on='Symbol', suffixes=('_old', '_new'))
+        differs = np.zeros(len(both), dtype=bool)
+        for c in cols[1:]:
+            differs |= (both[f"{c}_old"].fillna('') != both[f"{c}_new"].fillna('')).to_numpy()
+        changed = sorted(both.loc[differs, 'Symbol'])
+    return {
+        'added': sorted(new_symbols - old_symbols),
+        'removed': sorted(old_symbols - new_symbols),
+        'changed': changed,
+    }
+
+def refresh_sp500_constituents(ttl_hours=CONSTITUENTS_TTL_HOURS, force=False):
+    """
+    Returns (constituents, diff). The cached list is served as-is while younger than
+    ttl_hours; after that Wikipedia is asked with a conditional request
+    (ETag / Last-Modified) and the page is only parsed when it actually changed.
+    `diff` compares the returned list with the previously cached one.
+    """
+    cached, info = load_constituents()
+    no_change = {'added': [], 'removed': [], 'changed': []}
+    now = datetime.datetime.now()
+    
+    fetched_at = info.get('fetched_at')
+    if not force and not cached.empty and fetched_at:
+        age = now - datetime.datetime.fromisoformat(fetched_at)
+        if age < datetime.timedelta(hours=ttl_hours):
+            return cached, no_change
+    
     try:
-        url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(url, headers=headers)
+        if not cached.empty and not force:
+            if info.get('etag'): headers['If-None-Match'] = info['etag']
+            if info.get('last_modified'): headers['If-Modified-Since'] = info['last_modified']
+        response = requests.get(SP500_URL, headers=headers, timeout=30)
+        if response.status_code == 304:
+            info['fetched_at'] = now.isoformat()
+            save_constituents(None, info)
+            return cached, no_change
         response.raise_for_status()
         
         # Using lxml parser if possible to avoid dependencies issues
-        tables = pd.read_html(response.text)
+        tables = pd.read_html(io.StringIO(response.text))
         df = tables[0]
         
         # Initial cleanup
         df['Symbol'] = df['Symbol'].str.replace('.', '-', regex=False)
-        
-        # Return relevant columns
-        return df[['Symbol', 'Security', 'GICS Sector', 'GICS Sub-Industry']]
+        df = df[SP500_COLUMNS].reset_index(drop=True)
     except Exception as e:
         print(f"Error fetching S&P 500 tickers: {e}")
-        return pd.DataFrame()
+        # A stale list beats no list
+        return cached, no_change
+    
+    diff = diff_constituents(cached, df)
+    save_constituents(df, {
+        'fetched_at': now.isoformat(),
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    })
+    if not cached.empty and any(diff.values()):
+        print(f"S&P 500 changes: +{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])}")
+    return df, diff
+
+def get_sp500_tickers():
+    """Retrives S&P 500 tickers, names, and sectors (cached, see refresh_sp500_constituents)."""
+    return refresh_sp500_constituents()[0]
 
-def fetch_single_metadata(row, force_refresh):
-    """Helper to fetch metadata for a single row."""
+# Metadata refresh policy: the whole universe is re-fetched over this many days,
+# a bounded slice (oldest records first) per day on top of new/incomplete records.
+METADATA_REFRESH_DAYS = 30
+
+def plan_metadata_refresh(merged, force_refresh=False, refresh_days=METADATA_REFRESH_DAYS, now=None):
+    """
+    Picks the symbols whose metadata should be fetched in this run.
+    
+    New constituents and records with a missing summary/industry are always included,
+    first. On top of that, the oldest records by `LastUpdated` are refreshed up to a
+    daily budget of ceil(universe / refresh_days), minus whatever was already
+    refreshed today, so repeated runs on the same day do not add network work.
+    """
+    if force_refresh:
+        return merged['Symbol'].tolist()
+    
+    now = now or datetime.datetime.now()
+    def missing(col):
+        values = merged[col] if col in merged.columns else pd.Series("", index=merged.index)
+        return values.isna() | (values == "")
+    incomplete = missing('Business Summary') | missing('GICS Industry')
+    last_updated = pd.to_datetime(merged['LastUpdated'], errors='coerce') if 'LastUpdated' in merged.columns \
+        else pd.Series(pd.NaT, index=merged.index)
+    
+    # Never-fetched symbols (new constituents) go ahead of other incomplete records
+    urgent = merged[incomplete].assign(_new=last_updated[incomplete].isna()).sort_values('_new', ascending=False, kind='stable')
+    
+    budget = -(-len(merged) // max(refresh_days, 1))
+    today = pd.Timestamp(now).normalize()
+    refreshed_today = (last_updated >= today).sum()
+    remaining = max(0, budget - int(refreshed_today) - len(urgent))
+    
+    stale = last_updated[~incomplete & ~(last_updated >= today)].sort_values(kind='stable', na_position='first')
+    due = merged.loc[stale.index[:remaining], 'Symbol']
+    return urgent['Symbol'].tolist() + due.tolist()
+
+def fetch_single_metadata(row, info=None):
+    """
+    Builds the metadata record for a single row, applying freshly fetched info if any.
+    LastUpdated only moves forward when info was actually fetched.
+    """
     ticker = row['Symbol']
     summary = row.get('Business Summary', '')
     tags = row.get('Smart Tags', '')
     industry = row.get('GICS Industry', '')
     
-    needs_update = force_refresh or pd.isna(summary) or summary == "" or pd.isna(industry) or industry == ""
-    
-    if needs_update:
-        info = fetch_info_with_retry(ticker)
-        if info:
-            summary = info.get('longBusinessSummary', summary)
-            industry = info.get('industry', industry)
+    last_updated = row.get('LastUpdated', pd.NaT)
+    if info:
+        summary = info.get('longBusinessSummary', summary)
+        industry = info.get('industry', industry)
+        last_updated = datetime.datetime.now()
     
     # Automatic Tagging Removed - Themes are now strictly user-input
     return {
@@ -66,172 +171,275 @@ def fetch_single_metadata(row, force_refresh):
         'GICS Sub-Industry': row['GICS Sub-Industry'],
         'Business Summary': summary,
         'Smart Tags': tags,
-        'LastUpdated': datetime.datetime.now()
+        'LastUpdated': last_updated
     }
 
 def update_metadata(force_refresh=False):
     """
     Updates metadata for S&P 500 tickers.
     """
-    print("Updating metadata...")
-    current_df = load_metadata()
-    wiki_df = get_sp500_tickers()
+    # Held from load to save: a theme journal compaction (or another refresh) cannot
+    # write metadata.parquet in between and then be overwritten by this save
+    with metadata_lock():
+        print("Updating metadata...")
+        current_df = load_metadata()
+        wiki_df, _ = refresh_sp500_constituents(force=force_refresh)
     
-    if wiki_df.empty:
-        print("Failed to fetch S&P 500 list.")
-        return current_df
+        if wiki_df.empty:
+            print("Failed to fetch S&P 500 list.")
+            return current_df
         
-    if not current_df.empty:
-        existing_cols = [c for c in ['Symbol', 'Business Summary', 'Smart Tags', 'GICS Industry', 'LastUpdated'] if c in current_df.columns]
-        merged = pd.merge(wiki_df, current_df[existing_cols], on='Symbol', how='left')
-    else:
-        merged = wiki_df.copy()
-        merged['Business Summary'] = ""
-        merged['Smart Tags'] = ""
-        merged['GICS Industry'] = ""
-        merged['LastUpdated'] = pd.NaT
-
-    rows_to_process = [row.to_dict() for _, row in merged.iterrows()]
-    
-    print(f"Checking metadata for {len(rows_to_process)} tickers...")
-    updated_rows = []
-    
-    # Reduced threads to avoid Yahoo rate limits
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(fetch_single_metadata, r, force_refresh) for r in rows_to_process]
-        for future in concurrent.futures.as_completed(futures):
-            updated_rows.append(future.result())
+        if not current_df.empty:
+            existing_cols = [c for c in ['Symbol', 'Business Summary', 'Smart Tags', 'GICS Industry', 'LastUpdated'] if c in current_df.columns]
+            merged = pd.merge(wiki_df, current_df[existing_cols], on='Symbol', how='left')
+        else:
+            merged = wiki_df.copy()
+            merged['Business Summary'] = ""
+            merged['Smart Tags'] = ""
+            merged['GICS Industry'] = ""
+            merged['LastUpdated'] = pd.NaT
+
+        rows_to_process = merged.to_dict('records')
+        to_fetch = plan_metadata_refresh(merged, force_refresh=force_refresh)
+    
+        print(f"Checking metadata for {len(rows_to_process)} tickers ({len(to_fetch)} to fetch)...")
+        # Rate-limited, adaptive concurrency to stay under Yahoo's limits
+        infos, failed = fetch_infos(to_fetch)
+        if failed:
+            print(f"Metadata fetch gave up on {len(failed)} tickers: {', '.join(failed[:10])}")
+    
+        # Nothing fetched and the constituents match what is stored: skip the rewrite
+        changes = diff_constituents(current_df, wiki_df)
+        if not infos and not any(changes.values()) and not current_df.empty:
+            print("Metadata unchanged.")
+            return current_df
+    
+        updated_rows = [fetch_single_metadata(r, infos.get(r['Symbol'])) for r in rows_to_process]
         
-    new_metadata_df = pd.DataFrame(updated_rows)
-    save_metadata(new_metadata_df)
-    return new_metadata_df
+        new_metadata_df = pd.DataFrame(updated_rows)
+        save_metadata(new_metadata_df)
+        return new_metadata_df
 
 def update_market_data(tickers):
     """
     Updates market data (Price, Volume, Turnover).
     """
     print("Updating market data...")
-    existing_data = load_market_data()
+    today = datetime.date.today()
     
-    if not existing_data.empty:
-        last_date = pd.to_datetime(existing_data['Date'].max()).date()
-        start_date = last_date + datetime.timedelta(days=1)
-    else:
-        start_date = datetime.date.today() - datetime.timedelta(days=180)
-        
-    if start_date > datetime.date.today():
+    # Each ticker resumes from its own last bar (from the manifest); new symbols get the full history window
+    last_dates = {t: info['last'] for t, info in load_market_manifest()['tickers'].items()}
+    plan = plan_fetches(tickers, last_dates, today, today - datetime.timedelta(days=INITIAL_HISTORY_DAYS))
+    if not plan:
         print("Market data is up to date.")
-        return existing_data
-
-    print(f"Fetching data from {start_date}...")
-    fetch_start = start_date
-    if not existing_data.empty:
-        fetch_start = start_date - datetime.timedelta(days=7)
+        return pd.DataFrame()
     
-    try:
-        new_data = yf.download(tickers, start=fetch_start, group_by='ticker', auto_adjust=True, threads=True)
-    except Exception as e:
-        print(f"Error downloading market data: {e}")
-        return existing_data
+    planned = sum(len(group['tickers']) for group in plan)
+    new_tickers = sum(1 for t in tickers if t not in last_dates)
+    print(f"Fetching {planned - new_tickers} incremental and {new_tickers} new tickers "
+          f"in {len(plan)} requests (from {plan[0]['start']})...")
+    new_df = download_plan(plan, today)
+    if new_df.empty:
+        return new_df
         
-    if new_data.empty:
-        return existing_data
-        
-    final_dfs = []
-    for ticker in tickers:
-        try:
-            if ticker not in new_data.columns.levels[0]: continue
-            df = new_data[ticker].copy().reset_index()
-            df['Date'] = pd.to_datetime(df['Date']).dt.date
-            df['Turnover'] = df['Close'] * df['Volume']
-            df['Ticker'] = ticker
-            final_dfs.append(df[['Date', 'Ticker', 'Close', 'Volume', 'Turnover']])
-        except: continue
-            
-    if not final_dfs: return existing_data
-        
-    new_df = pd.concat(final_dfs)
-    combined = pd.concat([existing_data, new_df]).drop_duplicates(subset=['Date', 'Ticker'], keep='last')
-    combined = combined.sort_values(by=['Ticker', 'Date'])
-    save_market_data(combined)
-    return combined
+    # Only the delta is written; the full history is never re-encoded
+    append_market_data(new_df)
+    clear_download_checkpoint()
+    return new_df
 
-def get_monitor_data(force_refresh_metadata=False, as_of_date=None):
+# Bars a scan needs per ticker: the 20-bar turnover window (which also covers the 5-day base)
+SCAN_BARS = max(TURNOVER_WINDOW, PERF_WINDOW + 1)
+
+def load_scan_data(as_of_date, reference_date, tickers):
     """
-    Main entry point. Calculates stock metrics.
+    Market data a scan as of as_of_date (latest if None) needs, without reading the
+    whole history: the last SCAN_BARS trading dates and the last trading date before
+    January 1st of reference_date's year, both located with the manifest.
     
-    Args:
-        force_refresh_metadata: Force refresh of S&P 500 list
-        as_of_date: Calculate metrics as of this date (for historical view).
-                    If None, uses latest available data.
+    Tickers with gaps (fewer than SCAN_BARS bars in that window, or no bar on that
+    year-end date) but older history have their full history read instead, so the
+    metrics equal those over the complete panel. Only `tickers` (the symbols the scan
+    reports) are considered; removed constituents are never read in full.
     """
+    manifest = load_market_manifest()
+    dates = [d for d in manifest['dates'] if as_of_date is None or d <= as_of_date]
+    if not dates:
+        return pd.DataFrame()
+    start_of_year = datetime.date(reference_date.year, 1, 1)
+    recent_start = dates[max(len(dates) - SCAN_BARS, 0)]
+    year_end = [d for d in dates if d < start_of_year][-1:]
+    
+    market_data = load_market_windows([(recent_start, as_of_date)] + [(d, d) for d in year_end])
+    
+    recent_bars, has_year_end = pd.Series(dtype=int), set()
+    if not market_data.empty:
+        dates_loaded = pd.to_datetime(market_data['Date']).dt.date
+        recent_bars = market_data['Ticker'][dates_loaded >= recent_start].value_counts()
+        if year_end:
+            has_year_end = set(market_data['Ticker'][dates_loaded == year_end[0]])
+    short = []
+    for ticker in dict.fromkeys(tickers):
+        info = manifest['tickers'].get(ticker)
+        if info is None:
+            continue
+        if ((info['first'] < recent_start and recent_bars.get(ticker, 0) < SCAN_BARS)
+                or (info['first'] < start_of_year and ticker not in has_year_end)):
+            short.append(ticker)
+    if short:
+        history = load_market_windows([(None, as_of_date)], tickers=short)
+        if not history.empty:
+            market_data = normalize_market_data(
+                pd.concat([market_data, history], ignore_index=True).drop_duplicates(subset=['Date', 'Ticker']))
+    return market_data
+
+def update_sources(force_refresh_metadata=False):
+    """Network step of a scan: refreshes metadata and market data. Returns the metadata."""
     metadata = update_metadata(force_refresh=force_refresh_metadata)
     tickers = metadata['Symbol'].tolist()
-    market_data = update_market_data(tickers)
-    
-    if market_data.empty: return pd.DataFrame()
+    update_market_data(tickers)
+    return metadata
+
+def scan_market_data(metadata, as_of_date=None):
+    """
+    Local step of a scan: metrics and ranks from the stored market data only.
     
-    # Filter data up to as_of_date if specified
+    Args:
+        metadata: Metadata frame (see update_metadata / load_metadata)
+        as_of_date: Calculate metrics as of this date (for historical view).
+                    If None, uses latest available data.
+    """
     if as_of_date is not None:
         if isinstance(as_of_date, str):
             as_of_date = datetime.datetime.strptime(as_of_date, '%Y-%m-%d').date()
-        market_data = market_data[market_data['Date'] <= as_of_date]
-        if market_data.empty:
-            print(f"No data available for {as_of_date}")
-            return pd.DataFrame()
         reference_date = as_of_date
     else:
         reference_date = datetime.date.today()
     
-    print(f"Calculating metrics for {reference_date}...")
-    start_of_year = datetime.date(reference_date.year, 1, 1)
+    # Read only the bars the metrics need, not the whole history
+    market_data = load_scan_data(as_of_date, reference_date, metadata['Symbol'] if 'Symbol' in metadata.columns else [])
+    if market_data.empty:
+        print(f"No data available for {reference_date}")
+        return pd.DataFrame()
+    panel = Panel.from_frame(market_data)
     
-    results = []
-    for ticker, group in market_data.groupby('Ticker'):
-        try:
-            group = group.sort_values('Date')
-            
-            # Use last 20 days of available data
-            last_20 = group.tail(20)
-            avg_turnover = last_20['Turnover'].mean() if len(last_20) >= 20 else 0
-            
-            # YTD performance: compare to last trading day of previous year
-            # This is the standard financial definition of YTD
-            prev_year_data = group[group['Date'] < start_of_year]
-            if not prev_year_data.empty:
-                ytd_baseline_price = prev_year_data.iloc[-1]['Close']
-                current_price = group.iloc[-1]['Close']
-                ytd_perf = ((current_price - ytd_baseline_price) / ytd_baseline_price * 100)
-            else:
-                ytd_perf = None
-            
-            # 5-day performance
-            perf_5d = 0.0
-            if len(group) >= 6:
-                perf_5d = ((group.iloc[-1]['Close'] - group.iloc[-6]['Close']) / group.iloc[-6]['Close'] * 100)
-            
-            meta_row = metadata[metadata['Symbol'] == ticker].iloc[0]
-            
-            results.append({
-                "Ticker": ticker,
-                "Name": meta_row['Security'],
-                "Themes": meta_row['Smart Tags'],
-                "GICS Sector": meta_row['GICS Sector'],
-                "GICS Industry": meta_row.get('GICS Industry', ''),
-                "GICS Sub-Industry": meta_row['GICS Sub-Industry'],
-                "Current Price": group.iloc[-1]['Close'],
-                "Avg Daily Turnover (20d)": avg_turnover,
-                "Latest Turnover": group.iloc[-1]['Turnover'],
-                "Turnover Ratio": (group.iloc[-1]['Turnover'] / avg_turnover) if avg_turnover > 0 else 0,
-                "YTD Performance (%)": ytd_perf,
-                "5-Day Performance (%)": perf_5d
-            })
-        except: continue
-            
-    df_res = pd.DataFrame(results)
+    print(f"Calculating metrics for {reference_date}...")
+    df_res = compute_metrics(panel, metadata, reference_date, as_of_date)
     if df_res.empty: return df_res
+    return add_ranks(df_res)
+
+def get_monitor_data(force_refresh_metadata=False, as_of_date=None):
+    """
+    Main entry point. Calculates stock metrics.
+    
+    Args:
+        force_refresh_metadata: Force refresh of S&P 500 list
+        as_of_date: Calculate metrics as of this date (for historical view).
+                    If None, uses latest available data.
+    """
+    metadata = update_sources(force_refresh_metadata)
+    return scan_market_data(metadata, as_of_date)
+
+def window_metrics(panel, ends, year_starts):
+    """
+    Computes the metric matrices for several as-of positions at once.
+    
+    Args:
+        panel: storage.Panel
+        ends: (K,) number of panel dates included for each as-of position
+        year_starts: (K,) number of panel dates before January 1st of each reference year
+    
+    Returns a dict of (K x tickers) arrays. 'Rows' is each ticker's bar count; tickers
+    with no bars yet have Rows == 0 and their other entries are meaningless.
+    """
+    ends = np.asarray(ends)
+    year_starts = np.asarray(year_starts)
+    close, turnover = panel.compact
+    cols = np.arange(len(panel.tickers))
+    
+    n = panel.rows[np.maximum(ends - 1, 0)] * (ends > 0)[:, None]
+    n_before = panel.rows[np.maximum(year_starts - 1, 0)] * (year_starts > 0)[:, None]
+    
+    def nth_from_last(values, k):
+        return values[np.maximum(n - 1 - k, 0), cols]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current_price = nth_from_last(close, 0)
+        latest_turnover = nth_from_last(turnover, 0)
+        
+        # Use last 20 days of available data (NaN-skipping mean, like Series.mean)
+        window = turnover[np.maximum(n[..., None] - TURNOVER_WINDOW + np.arange(TURNOVER_WINDOW), 0), cols[:, None]]
+        valid = ~np.isnan(window)
+        avg_turnover = np.where(valid, window, 0.0).sum(axis=-1) / valid.sum(axis=-1)
+        avg_turnover = np.where(n >= TURNOVER_WINDOW, avg_turnover, 0.0)
+        
+        turnover_ratio = np.where(avg_turnover > 0, latest_turnover / avg_turnover, 0.0)
+        
+        # YTD performance: compare to last trading day of previous year
+        # This is the standard financial definition of YTD
+        baseline = close[np.maximum(n_before - 1, 0), cols]
+        ytd_perf = np.where(n_before > 0, (current_price - baseline) / baseline * 100, np.nan)
+        
+        # 5-day performance
+        base_5d = nth_from_last(close, PERF_WINDOW)
+        perf_5d = np.where(n >= PERF_WINDOW + 1, (current_price - base_5d) / base_5d * 100, 0.0)
+    
+    return {
+        'Rows': n,
+        'Current Price': current_price,
+        'Avg Daily Turnover (20d)': avg_turnover,
+        'Latest Turnover': latest_turnover,
+        'Turnover Ratio': turnover_ratio,
+        'YTD Performance (%)': ytd_perf,
+        '5-Day Performance (%)': perf_5d,
+    }
+
+def year_start_position(panel, reference_date):
+    """Number of panel dates before January 1st of reference_date's year."""
+    return panel.end(datetime.date(reference_date.year, 1, 1) - datetime.timedelta(days=1))
+
+def compute_metrics(panel, metadata, reference_date, as_of_date=None):
+    """
+    Vectorized metric engine. Computes the per-ticker metrics for all tickers at once
+    from the market data Panel, as of as_of_date (latest data if None).
+    
+    Metadata is attached with a single indexed join; tickers without metadata or
+    without any bar up to as_of_date are dropped.
+    """
+    end = panel.end(as_of_date)
+    if panel.is_empty or end == 0: return pd.DataFrame()
+    
+    metrics = window_metrics(panel, [end], [year_start_position(panel, reference_date)])
+    metrics = {k: v[0] for k, v in metrics.items()}
+    
+    meta = metadata.drop_duplicates(subset=['Symbol']).set_index('Symbol')
+    keep = (metrics.pop('Rows') > 0) & pd.Index(panel.tickers).isin(meta.index)
+    if not keep.any(): return pd.DataFrame()
+    tickers = panel.tickers[keep]
+    meta = meta.reindex(tickers)
+    
+    ytd_perf = metrics['YTD Performance (%)'][keep]
+    if np.isnan(ytd_perf).all():
+        # No baseline for anyone: keep the column as missing values, not floats
+        ytd_perf = [None] * len(ytd_perf)
     
-    # Calculate Ranks (1 is best)
+    return pd.DataFrame({
+        "Ticker": tickers,
+        "Name": meta['Security'].to_numpy(),
+        "Themes": meta['Smart Tags'].to_numpy(),
+        "GICS Sector": meta['GICS Sector'].to_numpy(),
+        "GICS Industry": meta['GICS Industry'].to_numpy() if 'GICS Industry' in meta.columns else '',
+        "GICS Sub-Industry": meta['GICS Sub-Industry'].to_numpy(),
+        "Current Price": metrics['Current Price'][keep],
+        "Avg Daily Turnover (20d)": metrics['Avg Daily Turnover (20d)'][keep],
+        "Latest Turnover": metrics['Latest Turnover'][keep],
+        "Turnover Ratio": metrics['Turnover Ratio'][keep],
+        "YTD Performance (%)": ytd_perf,
+        "5-Day Performance (%)": metrics['5-Day Performance (%)'][keep]
+    })
+
+def add_ranks(df_res):
+    """Adds the individual and overall ranks (1 is best) to a metrics frame."""
+    df_res = df_res.copy()
     df_res['Rank YTD%'] = df_res['YTD Performance (%)'].rank(ascending=False, method='min')
     df_res['Rank 5D%'] = df_res['5-Day Performance (%)'].rank(ascending=False, method='min')
     df_res['Rank Turnover Ratio'] = df_res['Turnover Ratio'].rank(ascending=False, method='min')
@@ -243,9 +451,128 @@ def get_monitor_data(force_refresh_metadata=False, as_of_date=None):
     df_res['Overall Rank'] = df_res['Overall Score'].rank(ascending=True, method='min')
     
     # Clean up intermediate score
-    df_res = df_res.drop(columns=['Overall Score'])
+    return df_res.drop(columns=['Overall Score'])
+
+def load_historical_snapshot(as_of_date):
+    """
+    Read-only path for the Historical View: no network I/O and no writes.
+    
+    Serves the saved snapshot from the snapshot database when there is one, otherwise
+    calculates it from the local market data and metadata files.
+    """
+    if isinstance(as_of_date, str):
+        as_of_date = datetime.datetime.strptime(as_of_date, '%Y-%m-%d').date()
+    
+    df = load_snapshot_by_date(as_of_date)
+    if not df.empty:
+        return df
+    
+    panel = load_market_panel()
+    metadata = load_metadata()
+    if panel.is_empty or metadata.empty or panel.end(as_of_date) == 0:
+        print(f"No data available for {as_of_date}")
+        return pd.DataFrame()
+    
+    df = compute_metrics(panel, metadata, as_of_date, as_of_date)
+    if df.empty: return df
+    return add_ranks(df)
+
+# --- Historical Snapshot Backfill ---
+
+# Dates per vectorized batch; bounds the (dates x tickers x 20) window gather
+BACKFILL_BATCH_SIZE = 64
+
+def _rank_rows(values, ascending):
+    """Ranks each row of a (dates x tickers) matrix, ignoring NaN (1 is best)."""
+    return pd.DataFrame(values).rank(axis=1, ascending=ascending, method='min').to_numpy()
+
+def compute_snapshot_history(panel, metadata, positions):
+    """
+    Metrics and ranks for the panel dates at `positions`, computed in one vectorized pass.
+    Each date is treated exactly like get_monitor_data(as_of_date=date).
+    Returns a long frame with a 'Scan Date' column followed by the scan result columns.
+    """
+    positions = np.asarray(positions)
+    if len(positions) == 0 or panel.is_empty: return pd.DataFrame()
+    dates = panel.dates[positions]
+    year_starts = np.searchsorted(panel.dates, dates.astype('datetime64[Y]').astype('datetime64[D]'), side='left')
+    
+    metrics = window_metrics(panel, positions + 1, year_starts)
+    meta = metadata.drop_duplicates(subset=['Symbol']).set_index('Symbol')
+    keep = (metrics.pop('Rows') > 0) & pd.Index(panel.tickers).isin(meta.index)[None, :]
+    metrics = {k: np.where(keep, v, np.nan) for k, v in metrics.items()}
+    
+    # Calculate Ranks per date (1 is best)
+    ranks = {
+        'Rank YTD%': _rank_rows(metrics['YTD Performance (%)'], ascending=False),
+        'Rank 5D%': _rank_rows(metrics['5-Day Performance (%)'], ascending=False),
+        'Rank Turnover Ratio': _rank_rows(metrics['Turnover Ratio'], ascending=False),
+        'Rank 20d Vol': _rank_rows(metrics['Avg Daily Turnover (20d)'], ascending=False),
+    }
+    overall_score = (ranks['Rank YTD%'] + ranks['Rank 5D%'] + ranks['Rank Turnover Ratio'] + ranks['Rank 20d Vol']) / 4
+    ranks['Overall Rank'] = _rank_rows(overall_score, ascending=True)
+    
+    di, ti = np.nonzero(keep)
+    meta = meta.reindex(panel.tickers)
+    columns = {
+        'Scan Date': np.datetime_as_string(dates)[di],
+        'Ticker': panel.tickers[ti],
+        'Name': meta['Security'].to_numpy()[ti],
+        'Themes': meta['Smart Tags'].to_numpy()[ti],
+        'GICS Sector': meta['GICS Sector'].to_numpy()[ti],
+        'GICS Industry': meta['GICS Industry'].to_numpy()[ti] if 'GICS Industry' in meta.columns else '',
+        'GICS Sub-Industry': meta['GICS Sub-Industry'].to_numpy()[ti],
+    }
+    columns.update({k: v[di, ti] for k, v in metrics.items()})
+    columns.update({k: v[di, ti] for k, v in ranks.items()})
+    return pd.DataFrame(columns)
+
+_worker_state = {}
+
+def _init_backfill_worker():
+    """Process pool initializer: each worker loads the panel and metadata once."""
+    _worker_state['panel'] = load_market_panel()
+    _worker_state['metadata'] = load_metadata()
+
+def _backfill_worker(positions):
+    return compute_snapshot_history(_worker_state['panel'], _worker_state['metadata'], positions)
+
+def backfill_snapshots(start_date=None, end_date=None, workers=1):
+    """
+    Computes snapshots for every trading date with enough history and writes them
+    to the snapshot database. Uses local data only (no network).
+    
+    Args:
+        start_date, end_date: Optional inclusive date range to backfill.
+        workers: Number of processes to fan the date batches out over (1 = in-process).
+    
+    Returns the number of dates written.
+    """
+    panel = load_market_panel()
+    metadata = load_metadata()
+    if panel.is_empty or metadata.empty:
+        print("No local market data or metadata to backfill from.")
+        return 0
+    
+    first = max(SNAPSHOT_MIN_HISTORY, panel.end(start_date - datetime.timedelta(days=1)) if start_date else 0)
+    last = panel.end(end_date)
+    positions = np.arange(first, last)
+    if len(positions) == 0:
+        print("No dates to backfill.")
+        return 0
+    
+    batches = [positions[i:i + BACKFILL_BATCH_SIZE] for i in range(0, len(positions), BACKFILL_BATCH_SIZE)]
+    print(f"Backfilling {len(positions)} dates in {len(batches)} batches...")
+    
+    if workers > 1 and len(batches) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_backfill_worker) as executor:
+            results = executor.map(_backfill_worker, batches)
+            written = sum(save_snapshots(frame) for frame in results)
+    else:
+        written = sum(save_snapshots(compute_snapshot_history(panel, metadata, batch)) for batch in batches)
     
-    return df_res
+    print(f"Snapshots saved for {len(positions)} dates ({written} rows)")
+    return len(positions)
 
 if __name__ == "__main__":
     get_monitor_data()
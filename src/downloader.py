@@ -0,0 +1,210 @@
+"""
+Chunked, resumable market data downloader.
+
+The universe is split into ticker chunks (and, for long ranges, date windows).
+Chunks run with bounded parallelism, are retried independently with jittered
+backoff, and every finished chunk is checkpointed to disk so an interrupted run
+picks up where it stopped instead of starting over.
+"""
+import concurrent.futures
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import pandas as pd
+
+from metadata_fetcher import backoff_delay
+from storage import DATA_DIR, ensure_data_dir
+
+DEFAULT_CHUNK_SIZE = 50       # tickers per chunk
+DEFAULT_DATE_CHUNK_DAYS = 366 # calendar days per chunk for long ranges
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 3
+OVERLAP_DAYS = 7              # re-fetch this many days before a ticker's last bar (late revisions)
+GROUP_TOLERANCE_DAYS = 7      # tickers whose start dates are this close share a request
+
+CHECKPOINT_DIR = os.path.join(DATA_DIR, "download_checkpoint")
+MARKET_COLUMNS = ['Date', 'Ticker', 'Close', 'Volume', 'Turnover']
+
+
+def split_tasks(tickers, start, end, chunk_size=DEFAULT_CHUNK_SIZE, date_chunk_days=DEFAULT_DATE_CHUNK_DAYS):
+    """Splits a download into (tickers, start, end) tasks; `end` is inclusive."""
+    windows = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(end, window_start + datetime.timedelta(days=date_chunk_days - 1))
+        windows.append((window_start, window_end))
+        window_start = window_end + datetime.timedelta(days=1)
+
+    tasks = []
+    for i in range(0, len(tickers), chunk_size):
+        for window_start, window_end in windows:
+            tasks.append({
+                'id': len(tasks),
+                'tickers': list(tickers[i:i + chunk_size]),
+                'start': window_start.isoformat(),
+                'end': window_end.isoformat(),
+            })
+    return tasks
+
+
+def plan_fetches(tickers, last_dates, end, history_start, overlap_days=OVERLAP_DAYS,
+                 tolerance_days=GROUP_TOLERANCE_DAYS):
+    """
+    Per-ticker incremental fetch plan.
+
+    Args:
+        tickers: Universe to keep up to date.
+        last_dates: Mapping ticker -> date of its last stored bar (missing = new symbol).
+        end: Last date to fetch (inclusive).
+        history_start: Start date for symbols with no stored bars (full history).
+
+    Each ticker needs bars from its own last date (minus a small overlap) or from
+    history_start if it is new. Tickers are then grouped greedily by start date so
+    that tickers whose starts are within tolerance_days share one request.
+    Returns a list of {'start': date, 'tickers': [...]} ordered by start.
+    """
+    starts = {}
+    for ticker in tickers:
+        last = last_dates.get(ticker)
+        if last is None or pd.isna(last):
+            starts[ticker] = history_start
+            continue
+        last = pd.Timestamp(last).date()
+        if last + datetime.timedelta(days=1) > end:
+            continue
+        starts[ticker] = max(history_start, last - datetime.timedelta(days=overlap_days - 1))
+
+    plan = []
+    for ticker, start in sorted(starts.items(), key=lambda item: (item[1], item[0])):
+        if plan and (start - plan[-1]['start']).days <= tolerance_days:
+            plan[-1]['tickers'].append(ticker)
+        else:
+            plan.append({'start': start, 'tickers': [ticker]})
+    return plan
+
+
+def fetch_history(ticker, start, end):
+    """Daily adjusted bars for one ticker between start and end (inclusive) as a long frame."""
+    import yfinance as yf
+    hist = yf.Ticker(ticker).history(start=start, end=end + datetime.timedelta(days=1), auto_adjust=True)
+    if hist.empty:
+        return pd.DataFrame(columns=MARKET_COLUMNS)
+    index = pd.DatetimeIndex(hist.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    df = pd.DataFrame({
+        'Date': index.date,
+        'Ticker': ticker,
+        'Close': hist['Close'].to_numpy(),
+        'Volume': hist['Volume'].to_numpy(),
+    })
+    df['Turnover'] = df['Close'] * df['Volume']
+    return df
+
+
+def download_chunk(task, fetch=fetch_history):
+    """Downloads one task. Any exception fails the whole chunk so it is retried as a unit."""
+    start = datetime.date.fromisoformat(task['start'])
+    end = datetime.date.fromisoformat(task['end'])
+    frames = [fetch(ticker, start, end) for ticker in task['tickers']]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=MARKET_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[MARKET_COLUMNS]
+
+
+def _job_key(tasks):
+    return hashlib.sha1(json.dumps(tasks, sort_keys=True).encode()).hexdigest()
+
+
+def _chunk_path(task):
+    return os.path.join(CHECKPOINT_DIR, f"chunk_{task['id']:05d}.parquet")
+
+
+def _open_checkpoint(tasks):
+    """Returns the ids of tasks already completed by a previous run of this same job."""
+    key = _job_key(tasks)
+    plan_file = os.path.join(CHECKPOINT_DIR, "plan.json")
+    if os.path.exists(plan_file):
+        try:
+            with open(plan_file, 'r') as f:
+                if json.load(f).get('key') == key:
+                    return {t['id'] for t in tasks if os.path.exists(_chunk_path(t))}
+        except Exception as e:
+            print(f"Error reading download checkpoint: {e}")
+    clear_checkpoint()
+    ensure_data_dir()
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    with open(plan_file, 'w') as f:
+        json.dump({'key': key, 'tasks': len(tasks), 'created': datetime.datetime.now().isoformat()}, f)
+    return set()
+
+
+def clear_checkpoint():
+    """Removes the download checkpoint. Call once the downloaded data has been persisted."""
+    if os.path.exists(CHECKPOINT_DIR):
+        shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+
+
+def download_market_data(tickers, start, end=None, **kwargs):
+    """Downloads bars for all `tickers` over one date range. See download_plan."""
+    return download_plan([{'start': start, 'tickers': list(tickers)}], end, **kwargs)
+
+
+def download_plan(plan, end=None, chunk_size=DEFAULT_CHUNK_SIZE, date_chunk_days=DEFAULT_DATE_CHUNK_DAYS,
+                  workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, fetch=fetch_history):
+    """
+    Downloads Date/Ticker/Close/Volume/Turnover bars for every group of a fetch plan
+    (see plan_fetches) up to end (inclusive, default today). Completed chunks are
+    checkpointed, so calling this again with the same plan after an interruption
+    only fetches what is missing.
+
+    Returns the long frame of everything downloaded (possibly partial if some
+    chunks kept failing; those are reported).
+    """
+    end = end or datetime.date.today()
+    tasks = []
+    for group in plan:
+        for task in split_tasks(group['tickers'], group['start'], end, chunk_size, date_chunk_days):
+            task['id'] = len(tasks)
+            tasks.append(task)
+    if not tasks:
+        return pd.DataFrame(columns=MARKET_COLUMNS)
+
+    done = _open_checkpoint(tasks)
+    pending = [t for t in tasks if t['id'] not in done]
+    if done:
+        print(f"Resuming download: {len(done)}/{len(tasks)} chunks already fetched")
+
+    def run(task):
+        for attempt in range(retries + 1):
+            try:
+                df = download_chunk(task, fetch)
+                # Write-then-rename so an interrupted write never looks like a finished chunk
+                path = _chunk_path(task)
+                df.to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+                return True
+            except Exception as e:
+                if attempt < retries:
+                    time.sleep(backoff_delay(attempt))
+                else:
+                    print(f"Chunk {task['id']} ({task['tickers'][0]}.., {task['start']}..{task['end']}) failed: {e}")
+        return False
+
+    n_tickers = sum(len(group['tickers']) for group in plan)
+    print(f"Downloading {len(pending)} chunks ({n_tickers} tickers in {len(plan)} date groups, up to {end})...")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        failed = sum(1 for ok in executor.map(run, pending) if not ok)
+    if failed:
+        print(f"{failed} chunks still failing after {retries} retries")
+
+    frames = [pd.read_parquet(_chunk_path(t)) for t in tasks if os.path.exists(_chunk_path(t))]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=MARKET_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
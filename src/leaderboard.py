@@ -0,0 +1,202 @@
+"""
+Group leaderboards (user themes, sectors, industries, sub-industries) for the scan table.
+
+All four dimensions come out of one groupby pass over a long frame of
+(dimension, group, stock metrics) rows, with Themes exploded from their
+comma-separated strings (see themes.parse_themes). Results are cached by the content of the columns they
+depend on, so Streamlit reruns (tab switches, row clicks) reuse them.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from themes import explode_themes, parse_themes
+
+# Group column -> whether it holds a comma-separated list of groups
+GROUP_COLUMNS = {
+    'Themes': True,
+    'GICS Sector': False,
+    'GICS Industry': False,
+    'GICS Sub-Industry': False,
+}
+
+# Averaged stock metric -> its rank column
+RANK_COLUMNS = {
+    'YTD Performance (%)': 'Rank YTD%',
+    '5-Day Performance (%)': 'Rank 5D%',
+    'Turnover Ratio': 'Rank Turnover Ratio',
+    'Latest Turnover': 'Rank 20d Vol',
+}
+
+CACHE_SIZE = 8  # distinct scans/theme edits kept
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def data_version(data):
+    """Content hash of the columns the leaderboards depend on."""
+    columns = [c for c in list(GROUP_COLUMNS) + list(RANK_COLUMNS) if c in data.columns]
+    digest = hashlib.sha1(",".join(columns).encode())
+    digest.update(pd.util.hash_pandas_object(data[columns], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def compute_leaderboards(data):
+    """
+    Returns {group column: leaderboard} for every column in GROUP_COLUMNS.
+
+    Each leaderboard is indexed by group name and holds the mean of each metric
+    over the group's stocks (Latest Turnover in $M), the stock Count, the rank of
+    each mean (1 = highest) and an Overall Rank of the average of those ranks.
+    It is sorted by Overall Rank. Dimensions without groups get an empty frame.
+    """
+    metrics = pd.DataFrame({
+        col: pd.to_numeric(data[col], errors='coerce').to_numpy() if col in data.columns else 0.0
+        for col in RANK_COLUMNS
+    }, index=pd.RangeIndex(len(data)))
+
+    parts = []
+    for col, is_list in GROUP_COLUMNS.items():
+        if col not in data.columns:
+            continue
+        if is_list:
+            labels = explode_themes(data[col])
+        else:
+            labels = data[col].reset_index(drop=True)
+            labels = labels[labels.notna() & (labels != "")]
+        part = metrics.loc[labels.index]
+        part.insert(0, 'Name', labels.to_numpy())
+        part.insert(0, 'Dimension', col)
+        parts.append(part)
+
+    empty = {col: pd.DataFrame() for col in GROUP_COLUMNS}
+    if not parts:
+        return empty
+    long = pd.concat(parts, ignore_index=True)
+    if long.empty:
+        return empty
+
+    grouped = long.groupby(['Dimension', 'Name'], sort=True)
+    board = grouped[list(RANK_COLUMNS)].mean()
+    board['Count'] = grouped.size()
+    board['Latest Turnover'] = board['Latest Turnover'] / 1_000_000
+
+    present = set(board.index.get_level_values('Dimension'))
+    return {col: _rank_leaderboard(board.xs(col, level='Dimension')) if col in present else pd.DataFrame()
+            for col in GROUP_COLUMNS}
+
+
+def _rank_leaderboard(board):
+    """Adds the metric ranks and Overall Rank to one dimension's means/Count, in display order."""
+    board = board.copy()
+    for col, rank_col in RANK_COLUMNS.items():
+        board[rank_col] = board[col].rank(ascending=False, method='min')
+    ytd, five_day, ratio, turnover = (board[c] for c in RANK_COLUMNS.values())
+    score = (ytd + five_day + ratio + turnover) / 4
+    board['Overall Rank'] = score.rank(ascending=True, method='min')
+    columns = ['Overall Rank'] + list(RANK_COLUMNS) + ['Count'] + list(RANK_COLUMNS.values())
+    return board[columns].sort_values(by='Overall Rank')
+
+
+def group_leaderboards(data):
+    """
+    Cached compute_leaderboards. The same scan (and theme assignment) returns the
+    same frames, so treat them as read-only.
+    """
+    key = data_version(data)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = compute_leaderboards(data)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+class ThemeAggregator:
+    """
+    Running per-theme sums and counts of the leaderboard metrics for one session's
+    scan table. A theme edit moves the ticker's metrics out of its old themes and
+    into its new ones, so only the touched groups change and the theme leaderboard
+    is re-ranked without regrouping the table.
+    """
+    def __init__(self, data):
+        self.tickers = data['Ticker'].to_numpy(dtype=object) if 'Ticker' in data.columns else np.array([], dtype=object)
+        values = np.column_stack([
+            pd.to_numeric(data[col], errors='coerce').to_numpy(dtype=float) if col in data.columns else np.zeros(len(data))
+            for col in RANK_COLUMNS
+        ]) if len(data) else np.empty((0, len(RANK_COLUMNS)))
+        self.values = dict(zip(self.tickers, values))
+        self.ticker_themes = {t: set() for t in self.tickers}
+        self.sums = {}    # theme -> per-metric sum of non-missing values
+        self.counts = {}  # theme -> per-metric number of non-missing values
+        self.sizes = {}   # theme -> number of stocks
+        self._board = None
+
+        exploded = explode_themes(data['Themes']) if 'Themes' in data.columns else pd.Series(dtype=object)
+        if exploded.empty:
+            return
+        rows = values[exploded.index.to_numpy()]
+        long = pd.DataFrame(rows, columns=list(RANK_COLUMNS))
+        long['Name'] = exploded.to_numpy()
+        grouped = long.groupby('Name', sort=False)
+        for theme, total, count, size in zip(grouped.size().index, grouped.sum().to_numpy(),
+                                             grouped.count().to_numpy(), grouped.size().to_numpy()):
+            self.sums[theme] = total
+            self.counts[theme] = count.astype(float)
+            self.sizes[theme] = int(size)
+        for position, theme in zip(exploded.index, exploded):
+            self.ticker_themes[self.tickers[position]].add(theme)
+
+    def matches(self, df):
+        """True if built over this frame's rows (same tickers, same order)."""
+        return len(df) == len(self.tickers) and (df.empty or np.array_equal(df['Ticker'].to_numpy(dtype=object), self.tickers))
+
+    def update(self, ticker, value):
+        """Moves `ticker` from its current themes to those in `value` (a Themes cell)."""
+        if ticker not in self.values:
+            return
+        old = self.ticker_themes[ticker]
+        new = set(parse_themes(value))
+        if new == old:
+            return
+        metrics = self.values[ticker]
+        present = ~np.isnan(metrics)
+        metrics = np.where(present, metrics, 0.0)
+        for theme in old - new:
+            self.sizes[theme] -= 1
+            if self.sizes[theme] == 0:
+                del self.sums[theme], self.counts[theme], self.sizes[theme]
+            else:
+                self.sums[theme] = self.sums[theme] - metrics
+                self.counts[theme] = self.counts[theme] - present
+        for theme in new - old:
+            self.sums[theme] = self.sums.get(theme, 0.0) + metrics
+            self.counts[theme] = self.counts.get(theme, 0.0) + present
+            self.sizes[theme] = self.sizes.get(theme, 0) + 1
+        self.ticker_themes[ticker] = new
+        self._board = None
+
+    def leaderboard(self):
+        """The Themes leaderboard (as compute_leaderboards), rebuilt from the sums after an edit."""
+        if self._board is None:
+            if not self.sizes:
+                self._board = pd.DataFrame()
+                return self._board
+            names = sorted(self.sizes)
+            sums = np.array([self.sums[n] for n in names])
+            counts = np.array([self.counts[n] for n in names])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = np.where(counts > 0, sums / counts, np.nan)
+            board = pd.DataFrame(means, index=pd.Index(names, name='Name'), columns=list(RANK_COLUMNS))
+            board['Count'] = np.array([self.sizes[n] for n in names], dtype=np.int64)
+            board['Latest Turnover'] = board['Latest Turnover'] / 1_000_000
+            self._board = _rank_leaderboard(board)
+        return self._board
@@ -0,0 +1,217 @@
+"""
+Rate-limited asynchronous fetcher for per-ticker metadata (Yahoo `info` summaries).
+
+Requests go through a token bucket (hard cap on requests per second) and an AIMD
+concurrency limit: every clean response lets concurrency creep up, every 401/429
+halves it. Failed requests are retried with jittered exponential backoff.
+
+The actual request is a plain blocking callable `fetch(ticker) -> dict` run in a
+worker thread, so the same machinery drives yfinance or a local stub HTTP server.
+"""
+import asyncio
+import concurrent.futures
+import random
+import re
+import time
+
+import requests
+
+# Defaults tuned for Yahoo's unauthenticated quote endpoints
+DEFAULT_RATE = 8.0            # requests per second
+DEFAULT_BURST = 8             # token bucket capacity
+DEFAULT_CONCURRENCY = 4       # starting number of requests in flight
+MAX_CONCURRENCY = 16
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5            # seconds, doubled per attempt
+BACKOFF_CAP = 8.0
+
+THROTTLE_STATUSES = {401, 429}
+
+
+class FetchError(Exception):
+    """Raised by fetch functions for failed requests. `status` is the HTTP status, if any."""
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+# Last-resort patterns for messages that carry a status but no attribute:
+# "HTTP 429", "HTTP Error 401: Unauthorized", "429 Client Error: Too Many Requests for url"
+STATUS_PATTERNS = [
+    re.compile(r'^HTTP(?: Error)? (\d{3})\b'),
+    re.compile(r'^(\d{3}) (?:Client|Server) Error\b'),
+]
+# Exception types that mean throttling whatever their message says
+THROTTLE_EXCEPTIONS = {'YFRateLimitError': 429}
+
+
+def _status_attribute(obj):
+    for attr in ('status', 'status_code', 'code'):
+        value = getattr(obj, attr, None)
+        if isinstance(value, int) and 100 <= value <= 599:
+            return value
+    return None
+
+
+def error_status(exc):
+    """
+    Best-effort HTTP status of an exception raised by requests, yfinance or a FetchError:
+    status attributes of the exception or its response first, then known exception
+    types, then an anchored status pattern at the start of the message.
+    """
+    status = _status_attribute(exc)
+    if status is None:
+        status = _status_attribute(getattr(exc, 'response', None))
+    if status is not None:
+        return status
+    for cls in type(exc).__mro__:
+        if cls.__name__ in THROTTLE_EXCEPTIONS:
+            return THROTTLE_EXCEPTIONS[cls.__name__]
+    text = str(exc).strip()
+    for pattern in STATUS_PATTERNS:
+        match = pattern.match(text)
+        if match:
+            return int(match.group(1))
+    if text.startswith('Too Many Requests'):
+        return 429
+    return None
+
+
+def is_throttled(exc):
+    return error_status(exc) in THROTTLE_STATUSES
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`."""
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Each clean response adds `increase / limit` (about one slot per round of
+    responses); a throttled response multiplies the limit by `decrease`, at most
+    once per `cooldown` seconds so a burst of in-flight failures counts once.
+    """
+    def __init__(self, initial=DEFAULT_CONCURRENCY, minimum=1, maximum=MAX_CONCURRENCY,
+                 increase=1.0, decrease=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, ok=True, throttled=False):
+        async with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            elif ok:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def yahoo_info(ticker):
+    """Fetches the yfinance `info` dict for a ticker. Raises FetchError if Yahoo returns nothing."""
+    import yfinance as yf
+    info = yf.Ticker(ticker).info
+    if not info:
+        raise FetchError(f"Empty info for {ticker}")
+    return info
+
+
+def http_json_fetcher(base_url, timeout=10):
+    """Returns a fetch function that GETs `{base_url}/{ticker}` and decodes JSON (e.g. a stub server)."""
+    session = requests.Session()
+
+    def fetch(ticker):
+        response = session.get(f"{base_url.rstrip('/')}/{ticker}", timeout=timeout)
+        if response.status_code != 200:
+            raise FetchError(f"HTTP {response.status_code} for {ticker}", status=response.status_code)
+        return response.json()
+
+    return fetch
+
+
+async def fetch_all(tickers, fetch, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                    concurrency=DEFAULT_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                    retries=DEFAULT_RETRIES):
+    """
+    Fetches every ticker with `fetch`, honouring the rate limit and adaptive concurrency.
+    Returns (results, failed): a dict ticker -> info and the list of tickers that gave up.
+    """
+    bucket = TokenBucket(rate, burst)
+    limiter = AIMDLimiter(initial=min(concurrency, max_concurrency), maximum=max_concurrency)
+    loop = asyncio.get_running_loop()
+    results = {}
+    failed = []
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        async def fetch_one(ticker):
+            for attempt in range(retries + 1):
+                await limiter.acquire()
+                await bucket.acquire()
+                try:
+                    info = await loop.run_in_executor(executor, fetch, ticker)
+                except Exception as e:
+                    throttled = is_throttled(e)
+                    await limiter.release(ok=False, throttled=throttled)
+                    if error_status(e) == 404:
+                        break
+                    if attempt < retries:
+                        await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                await limiter.release(ok=True)
+                results[ticker] = info
+                return
+            failed.append(ticker)
+
+        await asyncio.gather(*(fetch_one(t) for t in tickers))
+
+    print(f"Fetched {len(results)}/{len(tickers)} summaries "
+          f"({limiter.throttled} throttled responses, {len(failed)} failed, final concurrency {int(limiter.limit)})")
+    return results, failed
+
+
+def fetch_infos(tickers, fetch=None, **kwargs):
+    """Synchronous entry point for fetch_all. Uses yfinance unless another fetch function is given."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}, []
+    return asyncio.run(fetch_all(tickers, fetch or yahoo_info, **kwargs))
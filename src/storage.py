@@ -1,23 +1,154 @@
 
+import contextlib
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 import os
+import json
+import pathlib
+import shutil
+import threading
+import time
 from datetime import datetime
 
 DATA_DIR = "data"
 METADATA_FILE = os.path.join(DATA_DIR, "metadata.parquet")
-MARKET_DATA_FILE = os.path.join(DATA_DIR, "market_data.parquet")
+HOT_CACHE_DIR = os.path.join(DATA_DIR, "hot")  # uncompressed Arrow IPC copies of the parquet data
+MARKET_DATA_FILE = os.path.join(DATA_DIR, "market_data.parquet")  # legacy single-file layout
 
 def ensure_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
+def _file_version(path):
+    """Version token of a data file: (mtime, size), or None if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def _temp_path(path):
+    """Temporary name for a write-then-rename of `path`, unique to this process and thread."""
+    return f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+
+_held_locks = threading.local()  # lock files held by this thread (so they can be re-entered)
+
+@contextlib.contextmanager
+def _file_lock(path, blocking=True):
+    """
+    Exclusive OS lock on the lock file `path`, shared by every process and thread
+    using the data directory. Yields whether it was acquired (always True when
+    blocking). Re-entrant within a thread. The OS releases it if the process dies,
+    so it is never left stale.
+    """
+    held = _held_locks.__dict__.setdefault('paths', set())
+    key = os.path.abspath(path)
+    if key in held:
+        yield True
+        return
+    ensure_data_dir()
+    with open(path, 'a') as f:
+        f.seek(0)
+        acquired = False
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                while not acquired:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                        acquired = True
+                    except OSError:
+                        if not blocking:
+                            break
+                        time.sleep(0.05)
+            else:
+                import fcntl
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                    acquired = True
+                except BlockingIOError:
+                    pass
+            if acquired:
+                held.add(key)
+            yield acquired
+        finally:
+            held.discard(key)
+            if acquired and os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+# --- Arrow IPC Hot Cache ---
+# Parquet has to be decoded by every process that reads it. The hot cache keeps an
+# uncompressed Feather v2 copy next to it that is memory-mapped instead, so loads are
+# close to zero-copy and the scheduler and app processes share the same OS pages.
+# Market data is cached per month partition, so a write only rebuilds the partitions
+# it touched. Only writers build copies (right after changing the source); readers
+# use a copy when its version matches and otherwise fall back to parquet, so a read
+# never writes.
+
+def _hot_cache_path(name):
+    return os.path.join(HOT_CACHE_DIR, f"{name}.arrow")
+
+def _read_hot_cache(name, version):
+    """Memory-maps the hot copy `name` if it was built from `version` of its source, else None."""
+    if version is None:
+        return None
+    path = _hot_cache_path(name)
+    try:
+        with open(path + ".version", 'r') as f:
+            if json.load(f) != list(version):
+                return None
+        return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+def _write_hot_cache(name, version, table):
+    """Writes the hot copy of `table` for source `version` (write-then-rename, data before version)."""
+    if version is None:
+        return
+    path = _hot_cache_path(name)
+    try:
+        os.makedirs(HOT_CACHE_DIR, exist_ok=True)
+        tmp = _temp_path(path)
+        feather.write_feather(table, tmp, compression='uncompressed')
+        os.replace(tmp, path)
+        tmp = _temp_path(path + ".version")
+        with open(tmp, 'w') as f:
+            json.dump(list(version), f)
+        os.replace(tmp, path + ".version")
+    except OSError as e:
+        # e.g. another process still maps the old copy on Windows; readers use parquet
+        # until the next write that touches this source rebuilds it
+        print(f"Error writing hot cache {name}: {e}")
+
 # --- Metadata Storage ---
 
+# Held for every read-modify-write of metadata.parquet (update_metadata, theme journal
+# compaction) and by save_metadata, so one writer cannot overwrite another's changes
+METADATA_LOCK_FILE = os.path.join(DATA_DIR, "metadata.lock")
+
+def metadata_lock():
+    """Context manager holding the cross-process metadata lock (blocking, re-entrant)."""
+    return _file_lock(METADATA_LOCK_FILE)
+
 def load_metadata():
-    """Loads metadata from parquet file."""
+    """
+    Loads metadata, from the memory-mapped hot copy when it matches the parquet file
+    (parquet otherwise), with journalled theme edits applied over 'Smart Tags'.
+    """
     if os.path.exists(METADATA_FILE):
         try:
-            return pd.read_parquet(METADATA_FILE)
+            # Journal before parquet: a compaction finishing in between then cannot hide edits
+            entries = _read_theme_journal(THEME_JOURNAL_COMPACTING_FILE) + _read_theme_journal(THEME_JOURNAL_FILE)
+            version = _file_version(METADATA_FILE)
+            table = _read_hot_cache("metadata", version)
+            if table is None:
+                table = pq.read_table(METADATA_FILE)
+            return _apply_theme_journal(table.to_pandas(), entries)
         except Exception as e:
             print(f"Error loading metadata: {e}")
             return pd.DataFrame()
@@ -36,33 +167,821 @@ def save_metadata(df):
     # Our data.py puts a string "Theme1, Theme2". Correct.
     
     try:
-        df.to_parquet(METADATA_FILE, index=False)
+        with metadata_lock():
+            # Write-then-rename: theme edits read the parquet without the lock
+            tmp = _temp_path(METADATA_FILE)
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, METADATA_FILE)
+            _write_hot_cache("metadata", _file_version(METADATA_FILE), pq.read_table(METADATA_FILE))
         print(f"Metadata saved to {METADATA_FILE}")
     except Exception as e:
         print(f"Error saving metadata: {e}")
 
+# --- Theme Journal ---
+# Theme edits are appended to a small JSON-lines journal instead of rewriting
+# metadata.parquet. load_metadata applies it over 'Smart Tags'; once it grows past
+# THEME_JOURNAL_COMPACT_THRESHOLD entries a background thread folds it into the
+# parquet (under the metadata lock) and moves the entries to the history file.
+# Appends and the compaction's rename of the journal hold the journal lock file.
+
+THEME_JOURNAL_FILE = os.path.join(DATA_DIR, "theme_journal.jsonl")
+THEME_JOURNAL_COMPACTING_FILE = THEME_JOURNAL_FILE + ".compacting"
+THEME_HISTORY_FILE = os.path.join(DATA_DIR, "theme_history.jsonl")
+THEME_JOURNAL_COMPACT_THRESHOLD = 200
+THEME_JOURNAL_LOCK_FILE = THEME_JOURNAL_FILE + ".lock"
+
+_theme_journal_lock = threading.Lock()
+_theme_compaction_lock = threading.Lock()
+_journal_tails = {}  # journal path -> what _journal_tail has read of it so far
+
+def _read_theme_journal(path):
+    """Journal entries in write order. A torn last line (crash mid-append) is skipped."""
+    entries = []
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+def _journal_tail(path):
+    """
+    ({ticker: latest themes}, entry count) of a journal file, reading only what was
+    appended since the previous call. Caller holds _theme_journal_lock. A torn last
+    line is left for the next call (where, like _read_theme_journal, it is skipped).
+    """
+    state = _journal_tails.get(path)
+    try:
+        with open(path, 'rb') as f:
+            if state is not None:
+                # Same file as last time (not a new journal after a compaction)?
+                head = f.read(len(state['head']))
+                if head != state['head'] or os.fstat(f.fileno()).st_size < state['offset']:
+                    state = None
+            if state is None:
+                state = {'head': b"", 'offset': 0, 'latest': {}, 'count': 0}
+            f.seek(state['offset'])
+            data = f.read()
+    except FileNotFoundError:
+        _journal_tails.pop(path, None)
+        return {}, 0
+    end = data.rfind(b"\n") + 1
+    for line in data[:end].splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        state['latest'][entry['ticker']] = entry.get('themes') or ""
+        state['count'] += 1
+    if state['offset'] == 0:
+        state['head'] = data[:min(end, 256)]
+    state['offset'] += end
+    _journal_tails[path] = state
+    return state['latest'], state['count']
+
+def _stored_themes(tickers):
+    """{ticker: 'Smart Tags'} in metadata.parquet for those of `tickers` it holds."""
+    table = _read_hot_cache("metadata", _file_version(METADATA_FILE))
+    if table is None:
+        table = pq.read_table(METADATA_FILE, filters=[('Symbol', 'in', list(tickers))])
+    table = table.filter(pc.is_in(table['Symbol'], value_set=pa.array(list(tickers), pa.string())))
+    symbols = table['Symbol'].to_pylist()
+    tags = table['Smart Tags'].to_pylist() if 'Smart Tags' in table.column_names else [""] * len(symbols)
+    return dict(zip(symbols, tags))
+
+def _apply_theme_journal(df, entries):
+    """Sets 'Smart Tags' from journal entries (the latest entry per ticker wins)."""
+    if not entries or df.empty or 'Symbol' not in df.columns:
+        return df
+    latest = {e['ticker']: e.get('themes') or "" for e in entries}
+    if 'Smart Tags' not in df.columns:
+        df['Smart Tags'] = ""
+    edited = df['Symbol'].isin(list(latest)).to_numpy()
+    df.loc[edited, 'Smart Tags'] = df.loc[edited, 'Symbol'].map(latest).to_numpy()
+    return df
+
+def update_themes(changes):
+    """
+    Records {ticker: themes string} edits in the theme journal. Only tickers whose
+    current themes differ are written (missing and empty count as equal), so the
+    cost is O(edits) and concurrent writers append rather than overwrite each other:
+    the current themes of just the edited tickers are looked up, and the journal is
+    read only from where the previous call stopped.
+    Returns the number of tickers updated.
+    """
+    if not changes or not os.path.exists(METADATA_FILE):
+        return 0
+    new = {t: (v if isinstance(v, str) else "") for t, v in changes.items()}
+    ensure_data_dir()
+    with _theme_journal_lock, _file_lock(THEME_JOURNAL_LOCK_FILE):
+        try:
+            # Journals before parquet: a compaction finishing in between then cannot hide edits
+            compacting, _ = _journal_tail(THEME_JOURNAL_COMPACTING_FILE)
+            journal, count = _journal_tail(THEME_JOURNAL_FILE)
+            current = _stored_themes(new)
+        except Exception as e:
+            print(f"Error reading current themes: {e}")
+            return 0
+        changed = {}
+        for ticker, themes in new.items():
+            if ticker not in current:
+                continue
+            before = journal.get(ticker, compacting.get(ticker, current[ticker]))
+            if themes != (before if isinstance(before, str) else ""):
+                changed[ticker] = themes
+        if not changed:
+            print("Themes unchanged.")
+            return 0
+        now = datetime.now().isoformat()
+        with open(THEME_JOURNAL_FILE, 'a') as f:
+            f.write("".join(json.dumps({'ticker': t, 'themes': v, 'ts': now}) + "\n" for t, v in changed.items()))
+        count += len(changed)
+    print(f"Theme edits saved for {len(changed)} tickers")
+    
+    if count >= THEME_JOURNAL_COMPACT_THRESHOLD:
+        threading.Thread(target=compact_theme_journal, name="theme-journal-compaction").start()
+    return len(changed)
+
+def compact_theme_journal():
+    """
+    Folds the theme journal into metadata.parquet and appends its entries to the history
+    file. Runs under the metadata lock: if another process (or a metadata refresh) holds
+    it, this returns without doing anything and the next edit past the threshold retries.
+    """
+    with _theme_compaction_lock, _file_lock(METADATA_LOCK_FILE, blocking=False) as locked:
+        if not locked:
+            return
+        with _theme_journal_lock, _file_lock(THEME_JOURNAL_LOCK_FILE):
+            # New edits go to a fresh journal while this one is folded in. A leftover
+            # .compacting file is from a compaction that died; it is finished first.
+            if not os.path.exists(THEME_JOURNAL_COMPACTING_FILE):
+                if not os.path.exists(THEME_JOURNAL_FILE):
+                    return
+                os.replace(THEME_JOURNAL_FILE, THEME_JOURNAL_COMPACTING_FILE)
+        try:
+            entries = _read_theme_journal(THEME_JOURNAL_COMPACTING_FILE)
+            if entries and os.path.exists(METADATA_FILE):
+                save_metadata(_apply_theme_journal(pq.read_table(METADATA_FILE).to_pandas(), entries))
+            with open(THEME_HISTORY_FILE, 'a') as f:
+                f.writelines(json.dumps(e) + "\n" for e in entries)
+            os.remove(THEME_JOURNAL_COMPACTING_FILE)
+        except Exception as e:
+            print(f"Error compacting theme journal: {e}")
+
+def load_theme_history(ticker=None):
+    """Theme edits (Timestamp, Ticker, Themes) oldest first, optionally for one ticker."""
+    entries = []
+    for path in (THEME_HISTORY_FILE, THEME_JOURNAL_COMPACTING_FILE, THEME_JOURNAL_FILE):
+        entries.extend(_read_theme_journal(path))
+    history = pd.DataFrame({
+        'Timestamp': pd.to_datetime([e.get('ts') for e in entries]),
+        'Ticker': [e.get('ticker') for e in entries],
+        'Themes': [e.get('themes') or "" for e in entries],
+    })
+    if ticker is not None:
+        history = history[history['Ticker'] == ticker].reset_index(drop=True)
+    return history
+
+def metadata_version():
+    """Version token of the metadata as load_metadata sees it (parquet plus theme journal)."""
+    return (_file_version(METADATA_FILE), _file_version(THEME_JOURNAL_COMPACTING_FILE), _file_version(THEME_JOURNAL_FILE))
+
+# --- S&P 500 Constituent Cache ---
+
+CONSTITUENTS_FILE = os.path.join(DATA_DIR, "constituents.parquet")
+CONSTITUENTS_INFO_FILE = os.path.join(DATA_DIR, "constituents.json")
+
+def load_constituents():
+    """
+    Loads the cached constituent list and its fetch info
+    (fetched_at, etag, last_modified). Returns (DataFrame, dict).
+    """
+    df = pd.DataFrame()
+    info = {}
+    if os.path.exists(CONSTITUENTS_FILE):
+        try:
+            df = pd.read_parquet(CONSTITUENTS_FILE)
+        except Exception as e:
+            print(f"Error loading constituents: {e}")
+    if os.path.exists(CONSTITUENTS_INFO_FILE):
+        try:
+            with open(CONSTITUENTS_INFO_FILE, 'r') as f:
+                info = json.load(f)
+        except Exception as e:
+            print(f"Error loading constituents info: {e}")
+    return df, info
+
+def save_constituents(df, info):
+    """Saves the constituent list (if given) and its fetch info."""
+    ensure_data_dir()
+    try:
+        if df is not None:
+            df.to_parquet(CONSTITUENTS_FILE, index=False)
+        with open(CONSTITUENTS_INFO_FILE, 'w') as f:
+            json.dump(info, f, indent=4)
+    except Exception as e:
+        print(f"Error saving constituents: {e}")
+
 # --- Market Data Storage ---
+#
+# Market data is a partitioned dataset: data/market_data/year=YYYY/month=MM/part-*.parquet.
+# Updates append a small part file to each partition they touch; a partition is
+# compacted (deduplicated, one sorted file) once it accumulates COMPACT_THRESHOLD parts.
+# Part files are named by creation time, so reading them in name order and keeping
+# the last row per (Date, Ticker) gives the latest value.
+
+MARKET_DATA_DIR = os.path.join(DATA_DIR, "market_data")
+COMPACT_THRESHOLD = 8
+# Rows per parquet row group; with files sorted by (Ticker, Date), small groups let
+# ticker and date filters skip most of a file
+ROW_GROUP_SIZE = 4096
+
+# Held (with _compaction_lock) by whatever rewrites or removes part files: compaction,
+# save_market_data and the legacy migration. Appends only add new files.
+MARKET_DATA_LOCK_FILE = os.path.join(DATA_DIR, "market_data.lock")
+_compaction_lock = threading.Lock()
+
+# On-disk schema: dates as date32, tickers dictionary-encoded, Turnover in float32.
+# Close stays float64: every performance metric is a ratio of close prices.
+MARKET_SCHEMA = pa.schema([
+    ('Date', pa.date32()),
+    ('Ticker', pa.dictionary(pa.int32(), pa.string())),
+    ('Close', pa.float64()),
+    ('Volume', pa.int64()),
+    ('Turnover', pa.float32()),
+])
+
+def normalize_market_data(df):
+    """
+    Converts a market data frame to the compact in-memory schema: datetime64 Date,
+    categorical Ticker, float64 Close, int64 Volume, float32 Turnover. Bars without
+    a close are dropped. Columns that are absent (projections) are left out.
+    """
+    if df.empty:
+        return df
+    if 'Close' in df.columns:
+        df = df.dropna(subset=['Close'])
+    out = {}
+    if 'Date' in df.columns:
+        out['Date'] = df['Date'] if pd.api.types.is_datetime64_any_dtype(df['Date']) else pd.to_datetime(df['Date'])
+    if 'Ticker' in df.columns:
+        out['Ticker'] = df['Ticker'] if isinstance(df['Ticker'].dtype, pd.CategoricalDtype) else df['Ticker'].astype('category')
+    if 'Close' in df.columns:
+        out['Close'] = df['Close'].astype('float64')
+    if 'Volume' in df.columns:
+        out['Volume'] = df['Volume'].fillna(0).astype('int64')
+    if 'Turnover' in df.columns:
+        out['Turnover'] = df['Turnover'].astype('float32')
+    return pd.DataFrame(out)
+
+def _write_market_file(df, path):
+    """Writes market data with MARKET_SCHEMA via write-then-rename."""
+    table = pa.Table.from_pandas(normalize_market_data(df)[MARKET_SCHEMA.names], preserve_index=False)
+    table = table.cast(MARKET_SCHEMA).replace_schema_metadata(None)
+    tmp = _temp_path(path)
+    pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp, path)
+
+def _partition_dir(year, month):
+    return os.path.join(MARKET_DATA_DIR, f"year={year:04d}", f"month={month:02d}")
+
+def _list_partitions():
+    """Partition directories in chronological order."""
+    if not os.path.isdir(MARKET_DATA_DIR):
+        return []
+    partitions = []
+    for year_dir in sorted(os.listdir(MARKET_DATA_DIR)):
+        year_path = os.path.join(MARKET_DATA_DIR, year_dir)
+        if os.path.isdir(year_path):
+            partitions.extend(os.path.join(year_path, m) for m in sorted(os.listdir(year_path)))
+    return partitions
+
+def _list_parts(partition):
+    return sorted(os.path.join(partition, f) for f in os.listdir(partition) if f.endswith('.parquet'))
 
-def load_market_data():
-    """Loads market data from parquet file."""
-    if os.path.exists(MARKET_DATA_FILE):
+def _partition_month(partition):
+    """(year, month) of a partition directory."""
+    year_dir, month_dir = partition.split(os.sep)[-2:]
+    return int(year_dir.split('=')[1]), int(month_dir.split('=')[1])
+
+def _read_partition(partition, columns=None, filters=None):
+    """
+    Reads one partition. Filters are pushed down to pyarrow, which skips row groups
+    whose Date/Ticker statistics cannot match (files are sorted by Ticker, Date).
+    """
+    parts = _list_parts(partition)
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(list(columns) + (['Date', 'Ticker'] if len(parts) > 1 else [])))
+    frames = [pq.read_table(p, columns=read_columns, filters=filters).to_pandas(date_as_object=False) for p in parts]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if len(frames) > 1:
+        df = df.drop_duplicates(subset=['Date', 'Ticker'], keep='last')
+    return df[list(columns)] if columns is not None else df
+
+def _is_legacy_layout():
+    return os.path.exists(MARKET_DATA_FILE) and not os.path.isdir(MARKET_DATA_DIR)
+
+def _migrate_legacy_market_data():
+    """
+    Moves a single-file market_data.parquet into the partitioned layout (once).
+    Only the writers call this; until then readers read the legacy file as it is.
+    """
+    if not _is_legacy_layout():
+        return
+    with _compaction_lock, _file_lock(MARKET_DATA_LOCK_FILE):
+        if not _is_legacy_layout():
+            return  # another process migrated while we waited
+        print("Migrating market data to partitioned storage...")
+        _replace_market_data(normalize_market_data(pd.read_parquet(MARKET_DATA_FILE)))
+        os.replace(MARKET_DATA_FILE, MARKET_DATA_FILE + ".migrated")
+    update_market_manifest()
+    _refresh_market_hot_cache()
+
+def _load_legacy_market_data(start_date=None, end_date=None, tickers=None, columns=None):
+    """load_market_data over a not yet migrated market_data.parquet."""
+    df = normalize_market_data(pd.read_parquet(MARKET_DATA_FILE))
+    if df.empty:
+        return pd.DataFrame()
+    mask = np.ones(len(df), dtype=bool)
+    if start_date is not None:
+        mask &= (df['Date'] >= pd.Timestamp(start_date)).to_numpy()
+    if end_date is not None:
+        mask &= (df['Date'] <= pd.Timestamp(end_date)).to_numpy()
+    if tickers is not None:
+        mask &= df['Ticker'].isin(list(tickers)).to_numpy()
+    df = df[mask].reset_index(drop=True)
+    if df.empty:
+        return pd.DataFrame()
+    return df[list(columns)] if columns is not None else df
+
+def _filter_market_table(table, start_date=None, end_date=None, tickers=None, columns=None):
+    """Applies a load_market_data window/ticker/column selection to an in-memory Arrow table."""
+    mask = None
+    conditions = []
+    if start_date is not None:
+        conditions.append(pc.greater_equal(table['Date'], pa.scalar(start_date, pa.date32())))
+    if end_date is not None:
+        conditions.append(pc.less_equal(table['Date'], pa.scalar(end_date, pa.date32())))
+    if tickers is not None:
+        conditions.append(pc.is_in(table['Ticker'], value_set=pa.array(list(tickers), pa.string())))
+    for condition in conditions:
+        mask = condition if mask is None else pc.and_(mask, condition)
+    if mask is not None:
+        table = table.filter(mask)
+    if columns is not None:
+        table = table.select(list(columns))
+    if table.num_rows == 0:
+        return pd.DataFrame()
+    return normalize_market_data(table.to_pandas(date_as_object=False))
+
+def load_market_data(start_date=None, end_date=None, tickers=None, columns=None):
+    """
+    Loads market data from the partitioned parquet dataset.
+    
+    Args:
+        start_date, end_date: Optional inclusive date window. Month partitions outside
+                              it are not opened; inside, row groups are pruned by statistics.
+        tickers: Optional ticker subset (pruned the same way).
+        columns: Optional column projection.
+    
+    Partitions whose memory-mapped hot copy matches the partition's version are
+    filtered in memory instead of decoding parquet.
+    """
+    filters = []
+    if start_date is not None:
+        start_date = pd.Timestamp(start_date).date()
+        filters.append(('Date', '>=', start_date))
+    if end_date is not None:
+        end_date = pd.Timestamp(end_date).date()
+        filters.append(('Date', '<=', end_date))
+    if tickers is not None:
+        filters.append(('Ticker', 'in', list(tickers)))
+    
+    for attempt in range(3):
         try:
-            return pd.read_parquet(MARKET_DATA_FILE)
+            if _is_legacy_layout():
+                return _load_legacy_market_data(start_date, end_date, tickers, columns)
+            partitions = _list_partitions()
+            if start_date is not None:
+                partitions = [p for p in partitions if _partition_month(p) >= (start_date.year, start_date.month)]
+            if end_date is not None:
+                partitions = [p for p in partitions if _partition_month(p) <= (end_date.year, end_date.month)]
+            frames, hot = [], []
+            for partition in partitions:
+                table = _read_hot_cache(_partition_hot_name(partition), _partition_version(partition))
+                if table is not None:
+                    hot.append(table)
+                else:
+                    frames.append(_read_partition(partition, columns, filters or None))
+            if hot:
+                # One filter and one conversion over all memory-mapped partitions
+                frames.append(_filter_market_table(pa.concat_tables(hot), start_date, end_date, tickers, columns))
+            frames = [f for f in frames if not f.empty]
+            if not frames:
+                return pd.DataFrame()
+            return normalize_market_data(pd.concat(frames, ignore_index=True))
+        except FileNotFoundError:
+            # A compaction replaced part files while we were listing; read again
+            continue
         except Exception as e:
             print(f"Error loading market data: {e}")
             return pd.DataFrame()
     return pd.DataFrame()
 
+def _partition_hot_name(partition):
+    return f"market_data-{_partition_key(partition)}"
+
+def _partition_version(partition):
+    """Version token of one partition (changes when a part is added, replaced or removed)."""
+    versions = [_file_version(p) for p in _list_parts(partition)]
+    versions = [v for v in versions if v is not None]
+    if not versions:
+        return None
+    return (len(versions), max(v[0] for v in versions), sum(v[1] for v in versions))
+
+def _refresh_market_hot_cache(partitions=None):
+    """
+    Rebuilds the hot copies of the given partitions from parquet (default: all, which
+    also drops copies of partitions that no longer exist). Called by the writers.
+    """
+    if partitions is None:
+        partitions = _list_partitions()
+        keep = {_hot_cache_path(_partition_hot_name(p)) for p in partitions}
+        if os.path.isdir(HOT_CACHE_DIR):
+            for name in os.listdir(HOT_CACHE_DIR):
+                path = os.path.join(HOT_CACHE_DIR, name)
+                if name.startswith("market_data") and name.endswith(".arrow") and path not in keep:
+                    for stale in (path, path + ".version"):
+                        try:
+                            os.remove(stale)
+                        except OSError:
+                            pass
+    for partition in partitions:
+        for attempt in range(3):
+            try:
+                # Version first: if the partition changes while we read, the copy is simply never matched
+                version = _partition_version(partition)
+                df = _read_partition(partition)
+                if df.empty:
+                    break
+                df = normalize_market_data(df)
+                table = pa.Table.from_pandas(df[MARKET_SCHEMA.names], preserve_index=False)
+                _write_hot_cache(_partition_hot_name(partition), version,
+                                 table.cast(MARKET_SCHEMA).replace_schema_metadata(None))
+                break
+            except FileNotFoundError:
+                # A compaction replaced part files while we were reading; read again
+                continue
+            except Exception as e:
+                print(f"Error building market data hot cache for {partition}: {e}")
+                break
+
+def load_market_windows(windows, tickers=None, columns=None):
+    """Loads the union of several (start_date, end_date) windows, each read with pushdown."""
+    frames = [load_market_data(start, end, tickers, columns) for start, end in windows]
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    return normalize_market_data(pd.concat(frames, ignore_index=True).drop_duplicates(subset=['Date', 'Ticker']))
+
+def _write_part(partition, df, suffix=""):
+    os.makedirs(partition, exist_ok=True)
+    path = os.path.join(partition, f"part-{time.time_ns():020d}{suffix}.parquet")
+    _write_market_file(df, path)
+    return path
+
+def _split_by_month(df):
+    dates = pd.to_datetime(df['Date'])
+    return df.groupby([dates.dt.year.rename('year'), dates.dt.month.rename('month')], sort=True)
+
+def append_market_data(df, background_compaction=True):
+    """
+    Appends new bars as one small part file per touched month partition.
+    Rows may overlap existing ones; the newest write wins when reading.
+    Returns the list of touched partitions.
+    """
+    if df.empty:
+        return []
+    ensure_data_dir()
+    _migrate_legacy_market_data()
+    df = normalize_market_data(df)
+    touched = []
+    try:
+        for (year, month), part in _split_by_month(df):
+            partition = _partition_dir(year, month)
+            _write_part(partition, part.sort_values(['Ticker', 'Date']))
+            touched.append(partition)
+        print(f"Market data appended ({len(df)} rows, {len(touched)} partitions)")
+        update_market_manifest()
+        _refresh_market_hot_cache(touched)
+    except Exception as e:
+        print(f"Error appending market data: {e}")
+    
+    crowded = [p for p in touched if len(_list_parts(p)) >= COMPACT_THRESHOLD]
+    if crowded:
+        if background_compaction:
+            # Non-daemon so a short-lived process still finishes the compaction before exiting
+            threading.Thread(target=compact_market_data, args=(crowded,), name="market-data-compaction").start()
+        else:
+            compact_market_data(crowded)
+    return touched
+
+def compact_market_data(partitions=None):
+    """
+    Rewrites each partition (default: all) as a single deduplicated file sorted by
+    Ticker and Date. Only the given partitions are read and rewritten.
+    """
+    compacted = []
+    with _compaction_lock, _file_lock(MARKET_DATA_LOCK_FILE):
+        for partition in (partitions if partitions is not None else _list_partitions()):
+            parts = _list_parts(partition)
+            if len(parts) <= 1:
+                continue
+            try:
+                df = _read_partition(partition).sort_values(['Ticker', 'Date'])
+                # Named right after the newest input so parts appended meanwhile still sort later
+                newest = os.path.basename(parts[-1])[:-len('.parquet')]
+                path = os.path.join(partition, f"{newest}-c.parquet")
+                _write_market_file(df, path)
+                for p in parts:
+                    if p != path:
+                        os.remove(p)
+                compacted.append(partition)
+            except Exception as e:
+                print(f"Error compacting {partition}: {e}")
+    if compacted:
+        _refresh_market_hot_cache(compacted)
+
+def _replace_market_data(df):
+    """Rewrites the dataset as df, one file per partition. Caller holds the market data locks."""
+    if os.path.isdir(MARKET_DATA_DIR):
+        shutil.rmtree(MARKET_DATA_DIR)
+    for (year, month), part in _split_by_month(df):
+        _write_part(_partition_dir(year, month), part.sort_values(['Ticker', 'Date']))
+
 def save_market_data(df):
-    """Saves market data to parquet file."""
+    """Replaces the whole market data dataset with df (one compacted file per partition)."""
     ensure_data_dir()
+    df = normalize_market_data(df)
     try:
-        df.to_parquet(MARKET_DATA_FILE, index=False)
-        print(f"Market data saved to {MARKET_DATA_FILE}")
+        with _compaction_lock, _file_lock(MARKET_DATA_LOCK_FILE):
+            _replace_market_data(df)
+        update_market_manifest()
+        _refresh_market_hot_cache()
+        print(f"Market data saved to {MARKET_DATA_DIR}")
     except Exception as e:
         print(f"Error saving market data: {e}")
 
-import json
+def market_data_version():
+    """Version token of the market data dataset (changes on every append or compaction)."""
+    files = [os.path.join(p, f) for p in _list_partitions() for f in os.listdir(p)]
+    versions = [_file_version(f) for f in files]
+    versions = [v for v in versions if v is not None]
+    if not versions:
+        return _file_version(MARKET_DATA_FILE)
+    return (len(versions), max(v[0] for v in versions), sum(v[1] for v in versions))
+
+# --- Market Data Manifest ---
+# A small JSON summary of the dataset (trading dates, per-ticker first/last date and
+# row count) so date pickers, freshness checks and fetch planning never read bars.
+# It is kept per partition and stamped with the partition's newest part, so only
+# partitions that changed since the last update are re-summarised. Compaction keeps
+# the stamp (the compacted file is named after the newest part). Only the writers
+# persist it; readers summarise partitions the file is behind on in memory.
+
+MARKET_MANIFEST_FILE = os.path.join(DATA_DIR, "market_manifest.json")
+_manifest_cache = {}
+
+def _partition_key(partition):
+    year, month = _partition_month(partition)
+    return f"{year:04d}-{month:02d}"
+
+def _partition_stamp(partition):
+    parts = _list_parts(partition)
+    if not parts:
+        return None
+    name = os.path.basename(parts[-1])[:-len('.parquet')]
+    return name[:-len('-c')] if name.endswith('-c') else name
+
+def _summarize_partition(partition):
+    return _summarize_frame(_read_partition(partition, columns=['Ticker', 'Date']), _partition_stamp(partition))
+
+def _summarize_frame(df, stamp):
+    if df.empty:
+        return {'stamp': stamp, 'dates': [], 'tickers': {}}
+    dates = pd.to_datetime(df['Date'])
+    stats = dates.groupby(df['Ticker'].astype(str)).agg(['min', 'max', 'size'])
+    return {
+        'stamp': stamp,
+        'dates': [d.date().isoformat() for d in sorted(dates.unique())],
+        'tickers': {t: [lo.date().isoformat(), hi.date().isoformat(), int(n)]
+                    for t, lo, hi, n in zip(stats.index, stats['min'], stats['max'], stats['size'])},
+    }
+
+def _read_manifest_file():
+    version = _file_version(MARKET_MANIFEST_FILE)
+    cached = _manifest_cache.get('partitions')
+    if cached is not None and version is not None and cached[0] == version:
+        return cached[1]
+    try:
+        with open(MARKET_MANIFEST_FILE, 'r') as f:
+            partitions = json.load(f).get('partitions', {})
+    except (OSError, ValueError):
+        return {}
+    _manifest_cache['partitions'] = (version, partitions)
+    return partitions
+
+def _manifest_partitions():
+    """
+    Per-partition summaries matching the partitions on disk, and whether they differ
+    from the persisted manifest. Partitions whose newest part changed are re-summarised
+    in memory (and kept until they change again); nothing is written.
+    """
+    rebuilt = _manifest_cache.setdefault('rebuilt', {})
+    if _is_legacy_layout():
+        # Not migrated yet (only writers migrate): summarise the single file in memory
+        stamp = repr(_file_version(MARKET_DATA_FILE))
+        entry = rebuilt.get('legacy')
+        if entry is None or entry['stamp'] != stamp:
+            entry = rebuilt['legacy'] = _summarize_frame(
+                normalize_market_data(pd.read_parquet(MARKET_DATA_FILE, columns=['Ticker', 'Date'])), stamp)
+        return {'legacy': entry}, True
+    for attempt in range(3):
+        try:
+            stored = _read_manifest_file()
+            partitions = {_partition_key(p): p for p in _list_partitions()}
+            current = {}
+            changed = set(stored) != set(partitions)
+            for key, partition in partitions.items():
+                stamp = _partition_stamp(partition)
+                entry = stored.get(key)
+                if entry is None or entry.get('stamp') != stamp:
+                    entry = rebuilt.get(key)
+                    if entry is None or entry.get('stamp') != stamp:
+                        entry = rebuilt[key] = _summarize_partition(partition)
+                    changed = True
+                current[key] = entry
+            return current, changed
+        except FileNotFoundError:
+            # A compaction replaced part files while we were listing; look again
+            continue
+    return _read_manifest_file(), False
+
+def update_market_manifest():
+    """
+    Brings the persisted manifest in line with the partitions on disk, re-summarising
+    only partitions whose newest part changed. Called by the market data writers.
+    Returns the per-partition summaries.
+    """
+    current, changed = _manifest_partitions()
+    if changed:
+        ensure_data_dir()
+        tmp = _temp_path(MARKET_MANIFEST_FILE)
+        with open(tmp, 'w') as f:
+            json.dump({'partitions': current}, f)
+        os.replace(tmp, MARKET_MANIFEST_FILE)
+    return current
+
+def load_market_manifest():
+    """
+    Dataset summary: {'dates': sorted trading dates, 'tickers': {ticker: {'first', 'last', 'rows'}}}
+    with datetime.date values. Read-only: if the persisted manifest is behind the
+    dataset, the stale partitions are summarised in memory. Cached in-process until
+    a partition changes.
+    """
+    partitions, _ = _manifest_partitions()
+    version = tuple(sorted((key, entry.get('stamp')) for key, entry in partitions.items()))
+    cached = _manifest_cache.get('summary')
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    to_date = datetime.fromisoformat
+    dates = set()
+    tickers = {}
+    for entry in partitions.values():
+        dates.update(entry['dates'])
+        for ticker, (first, last, rows) in entry['tickers'].items():
+            seen = tickers.get(ticker)
+            if seen is None:
+                tickers[ticker] = {'first': first, 'last': last, 'rows': rows}
+            else:
+                seen['first'] = min(seen['first'], first)
+                seen['last'] = max(seen['last'], last)
+                seen['rows'] += rows
+    for info in tickers.values():
+        info['first'] = to_date(info['first']).date()
+        info['last'] = to_date(info['last']).date()
+    manifest = {'dates': [to_date(d).date() for d in sorted(dates)], 'tickers': tickers}
+    _manifest_cache['summary'] = (version, manifest)
+    return manifest
+
+# --- Market Data Panel ---
+
+class Panel:
+    """
+    Dense date x ticker view of the market data.
+    
+    The long (Date, Ticker, Close, Volume, Turnover) frame is pivoted once into aligned
+    NumPy matrices with NaN where a ticker has no bar. `present` marks which cells hold
+    a row and `rows` counts each ticker's rows up to and including every date, so
+    "the ticker's last N bars as of date d" is plain index arithmetic.
+    """
+    def __init__(self, dates, tickers, close, volume, turnover, present):
+        self.dates = dates
+        self.tickers = tickers
+        self.close = close
+        self.volume = volume
+        self.turnover = turnover
+        self.present = present
+        self.date_index = {d: i for i, d in enumerate(dates.tolist())}
+        self.ticker_index = {t: j for j, t in enumerate(tickers.tolist())}
+        self._rows = None
+        self._compact = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """Pivots a long market data frame. Duplicate (Date, Ticker) rows keep the last one."""
+        if df.empty:
+            return cls.empty()
+        df = df.dropna(subset=['Ticker', 'Date'])
+        date_codes, dates = pd.factorize(pd.to_datetime(df['Date']).to_numpy().astype('datetime64[D]'), sort=True)
+        ticker_codes, tickers = pd.factorize(df['Ticker'].astype(str).to_numpy(), sort=True)
+        shape = (len(dates), len(tickers))
+        
+        def pivot(col):
+            mat = np.full(shape, np.nan)
+            mat[date_codes, ticker_codes] = df[col].to_numpy(dtype=float)
+            return mat
+        
+        present = np.zeros(shape, dtype=bool)
+        present[date_codes, ticker_codes] = True
+        return cls(np.asarray(dates).astype('datetime64[D]'), np.asarray(tickers, dtype=object),
+                   pivot('Close'), pivot('Volume'), pivot('Turnover'), present)
+
+    @classmethod
+    def empty(cls):
+        nothing = np.empty((0, 0))
+        return cls(np.array([], dtype='datetime64[D]'), np.array([], dtype=object),
+                   nothing, nothing, nothing, nothing.astype(bool))
+
+    @property
+    def is_empty(self):
+        return len(self.dates) == 0 or len(self.tickers) == 0
+
+    @property
+    def rows(self):
+        """(dates x tickers) cumulative count of each ticker's rows."""
+        if self._rows is None:
+            self._rows = np.cumsum(self.present, axis=0)
+        return self._rows
+
+    @property
+    def compact(self):
+        """
+        Row-compacted Close and Turnover: entry [k, j] is the k-th row of ticker j.
+        Combined with `rows`, this addresses a ticker's own last N bars at any date.
+        """
+        if self._compact is None:
+            order = np.argsort(~self.present, axis=0, kind='stable')
+            depth = int(self.rows[-1].max()) if len(self.dates) else 0
+            order = order[:depth]
+            self._compact = (np.take_along_axis(self.close, order, axis=0),
+                             np.take_along_axis(self.turnover, order, axis=0))
+        return self._compact
+
+    def end(self, as_of_date=None):
+        """Number of dates on or before as_of_date (all dates if None)."""
+        if as_of_date is None:
+            return len(self.dates)
+        return int(np.searchsorted(self.dates, np.datetime64(pd.Timestamp(as_of_date).date(), 'D'), side='right'))
+
+    def slice(self, as_of_date):
+        """Returns a Panel restricted to dates on or before as_of_date (views, no copies)."""
+        end = self.end(as_of_date)
+        return Panel(self.dates[:end], self.tickers, self.close[:end], self.volume[:end],
+                     self.turnover[:end], self.present[:end])
+
+_panel_cache = {}
+
+def load_market_panel():
+    """Loads market data as a Panel, cached per version of the market data dataset."""
+    version = market_data_version()
+    if version is None:
+        return Panel.empty()
+    cached = _panel_cache.get(MARKET_DATA_DIR)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    panel = Panel.from_frame(load_market_data())
+    _panel_cache[MARKET_DATA_DIR] = (version, panel)
+    return panel
 
 SETTINGS_FILE = os.path.join(DATA_DIR, "settings.json")
 
@@ -94,24 +1013,20 @@ def get_latest_date(df):
         return None
     return df['Date'].max()
 
+# Trading days of history required before a date can be snapshotted
+SNAPSHOT_MIN_HISTORY = 20
+
 def get_available_snapshot_dates():
     """
     Get list of dates with sufficient market data for snapshot calculation.
     Returns dates that have at least 20 days of prior data (for 20-day averages).
     """
-    market_data = load_market_data()
-    if market_data.empty:
-        return []
-    
-    # Get all unique dates, sorted
-    all_dates = sorted(market_data['Date'].unique())
+    # Trading dates come sorted from the manifest; no bars are read
+    all_dates = load_market_manifest()['dates']
     
     # Only return dates that have at least 20 days of prior data
     # This ensures we can calculate 20-day averages
-    valid_dates = []
-    for i, date in enumerate(all_dates):
-        if i >= 20:  # Need at least 20 prior days
-            valid_dates.append(date)
+    valid_dates = all_dates[SNAPSHOT_MIN_HISTORY:]
     
     # Return as list of strings in descending order (most recent first)
     return [str(d) for d in reversed(valid_dates)]
@@ -122,11 +1037,55 @@ import sqlite3
 
 SNAPSHOT_DB = os.path.join(DATA_DIR, "snapshots.db")
 
-def init_snapshot_db():
+# Table column -> (scan result column, type); the type decides how save_snapshots converts it
+SNAPSHOT_COLUMNS = {
+    'ticker': ('Ticker', 'text'),
+    'name': ('Name', 'text'),
+    'themes': ('Themes', 'text'),
+    'overall_rank': ('Overall Rank', 'int'),
+    'rank_ytd': ('Rank YTD%', 'int'),
+    'rank_5d': ('Rank 5D%', 'int'),
+    'rank_turnover_ratio': ('Rank Turnover Ratio', 'int'),
+    'rank_20d_vol': ('Rank 20d Vol', 'int'),
+    'gics_sector': ('GICS Sector', 'text'),
+    'gics_industry': ('GICS Industry', 'text'),
+    'gics_sub_industry': ('GICS Sub-Industry', 'text'),
+    'current_price': ('Current Price', 'real'),
+    'latest_turnover': ('Latest Turnover', 'real'),
+    'avg_daily_turnover_20d': ('Avg Daily Turnover (20d)', 'real'),
+    'turnover_ratio': ('Turnover Ratio', 'real'),
+    'ytd_performance': ('YTD Performance (%)', 'real'),
+    'five_day_performance': ('5-Day Performance (%)', 'real'),
+}
+
+# WAL lets the app read while the scheduler or a backfill writes. It is a property
+# of the database file, so only init_snapshot_db (the writer side) switches to it.
+SNAPSHOT_JOURNAL_MODE = 'WAL'
+# Per-connection settings; NORMAL sync is durable across application crashes and only
+# fsyncs at checkpoints
+SNAPSHOT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'cache_size': -65536,  # KiB (64 MB)
+}
+SNAPSHOT_BUSY_TIMEOUT = 30  # seconds to wait for another writer
+
+_snapshot_local = threading.local()  # connections per thread (sqlite3 connections are not shared)
+_snapshot_db_ready = set()           # databases whose schema this process has already created
+_snapshot_db_lock = threading.Lock()
+
+def snapshot_db_version():
+    """Version token of the snapshot database (None if it does not exist yet)."""
+    return (_file_version(SNAPSHOT_DB), _file_version(SNAPSHOT_DB + "-wal"))
+
+def init_snapshot_db(conn=None):
     """Initialize the snapshot database with schema."""
     ensure_data_dir()
-    conn = sqlite3.connect(SNAPSHOT_DB)
+    own = conn is None
+    if own:
+        conn = sqlite3.connect(SNAPSHOT_DB)
     cursor = conn.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SNAPSHOT_JOURNAL_MODE}")
     
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS daily_snapshots (
@@ -153,11 +1112,56 @@ def init_snapshot_db():
         )
     """)
     
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_scan_date ON daily_snapshots(scan_date)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ticker ON daily_snapshots(ticker)")
+    # Covering indexes for the history and movers queries; they also replace the
+    # single-column indexes, which were prefixes of these
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ticker_date_rank ON daily_snapshots(ticker, scan_date, overall_rank)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_date_rank_ticker ON daily_snapshots(scan_date, overall_rank, ticker)")
+    cursor.execute("DROP INDEX IF EXISTS idx_scan_date")
+    cursor.execute("DROP INDEX IF EXISTS idx_ticker")
     
     conn.commit()
-    conn.close()
+    if own:
+        conn.close()
+
+def snapshot_connection(readonly=False):
+    """
+    This thread's pooled connection to the snapshot database, with SNAPSHOT_PRAGMAS
+    applied. The writer connection creates the schema (once per process); a read-only
+    connection is opened with mode=ro and never changes the file. A database file that
+    was removed or replaced (or a forked child) gets a fresh connection.
+    """
+    path = os.path.abspath(SNAPSHOT_DB)
+    connections = getattr(_snapshot_local, 'connections', None)
+    if connections is None:
+        connections = _snapshot_local.connections = {}  # readonly -> (pid, path, inode, connection)
+    cached = connections.get(readonly)
+    # A child inherits the parent's connection through fork; it must never use it
+    if cached is not None and cached[0] == os.getpid():
+        _, cached_path, cached_inode, conn = cached
+        try:
+            if cached_path == path and os.stat(path).st_ino == cached_inode:
+                return conn
+        except OSError:
+            pass
+        conn.close()
+        if not readonly:
+            with _snapshot_db_lock:
+                _snapshot_db_ready.discard(path)
+    
+    if readonly:
+        conn = sqlite3.connect(pathlib.Path(path).as_uri() + "?mode=ro", uri=True, timeout=SNAPSHOT_BUSY_TIMEOUT)
+    else:
+        ensure_data_dir()
+        conn = sqlite3.connect(path, timeout=SNAPSHOT_BUSY_TIMEOUT)
+    for pragma, value in SNAPSHOT_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+    if not readonly:
+        with _snapshot_db_lock:
+            if path not in _snapshot_db_ready:
+                init_snapshot_db(conn)
+                _snapshot_db_ready.add(path)
+    connections[readonly] = (os.getpid(), path, os.stat(path).st_ino, conn)
+    return conn
 
 def save_daily_snapshot(df, scan_date=None):
     """Save a complete scan result with timestamp."""
@@ -167,91 +1171,144 @@ def save_daily_snapshot(df, scan_date=None):
     if scan_date is None:
         scan_date = datetime.now().date()
     
-    init_snapshot_db()
-    conn = sqlite3.connect(SNAPSHOT_DB)
+    count = save_snapshots(df.assign(**{'Scan Date': str(scan_date)}))
+    print(f"Snapshot saved for {scan_date} ({count} stocks)")
+
+def _snapshot_values(df, column, kind):
+    """One scan result column as a list of sqlite values (None for missing)."""
+    if column not in df.columns:
+        return [''] * len(df) if kind == 'text' else [None] * len(df)
+    if kind == 'text':
+        values = df[column].to_numpy(dtype=object)
+        return np.where(pd.isna(values), None, values).tolist()
+    values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+    missing = np.isnan(values)
+    out = np.full(len(values), None, dtype=object)
+    present = values[~missing]
+    out[~missing] = (present.astype(np.int64) if kind == 'int' else present).tolist()
+    return out.tolist()
+
+def save_snapshots(df):
+    """
+    Save scan results for any number of dates in a single transaction.
+    Expects a 'Scan Date' column next to the usual scan result columns.
+    Returns the number of rows written.
+    """
+    if df.empty:
+        return 0
     
-    # Prepare data for insertion
-    records = []
-    for _, row in df.iterrows():
-        records.append((
-            str(scan_date),
-            row.get('Ticker', ''),
-            row.get('Name', ''),
-            row.get('Themes', ''),
-            int(row.get('Overall Rank', 0)) if pd.notna(row.get('Overall Rank')) else None,
-            int(row.get('Rank YTD%', 0)) if pd.notna(row.get('Rank YTD%')) else None,
-            int(row.get('Rank 5D%', 0)) if pd.notna(row.get('Rank 5D%')) else None,
-            int(row.get('Rank Turnover Ratio', 0)) if pd.notna(row.get('Rank Turnover Ratio')) else None,
-            int(row.get('Rank 20d Vol', 0)) if pd.notna(row.get('Rank 20d Vol')) else None,
-            row.get('GICS Sector', ''),
-            row.get('GICS Industry', ''),
-            row.get('GICS Sub-Industry', ''),
-            float(row.get('Current Price', 0)) if pd.notna(row.get('Current Price')) else None,
-            float(row.get('Latest Turnover', 0)) if pd.notna(row.get('Latest Turnover')) else None,
-            float(row.get('Avg Daily Turnover (20d)', 0)) if pd.notna(row.get('Avg Daily Turnover (20d)')) else None,
-            float(row.get('Turnover Ratio', 0)) if pd.notna(row.get('Turnover Ratio')) else None,
-            float(row.get('YTD Performance (%)', 0)) if pd.notna(row.get('YTD Performance (%)')) else None,
-            float(row.get('5-Day Performance (%)', 0)) if pd.notna(row.get('5-Day Performance (%)')) else None,
-        ))
+    # Convert column by column, then zip into rows for executemany
+    columns = [df['Scan Date'].astype(str).tolist()]
+    columns += [_snapshot_values(df, column, kind) for column, kind in SNAPSHOT_COLUMNS.values()]
+    records = zip(*columns)
     
+    names = ", ".join(['scan_date'] + list(SNAPSHOT_COLUMNS))
+    placeholders = ", ".join(["?"] * (len(SNAPSHOT_COLUMNS) + 1))
+    conn = snapshot_connection()
     # Use INSERT OR REPLACE to handle duplicates
-    conn.executemany("""
-        INSERT OR REPLACE INTO daily_snapshots (
-            scan_date, ticker, name, themes, overall_rank, rank_ytd, rank_5d,
-            rank_turnover_ratio, rank_20d_vol, gics_sector, gics_industry,
-            gics_sub_industry, current_price, latest_turnover, avg_daily_turnover_20d,
-            turnover_ratio, ytd_performance, five_day_performance
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, records)
-    
-    conn.commit()
-    conn.close()
-    print(f"Snapshot saved for {scan_date} ({len(records)} stocks)")
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO daily_snapshots ({names}) VALUES ({placeholders})", records)
+    return len(df)
 
 def get_available_dates():
     """Return list of all dates with saved snapshots."""
     if not os.path.exists(SNAPSHOT_DB):
         return []
     
-    conn = sqlite3.connect(SNAPSHOT_DB)
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT scan_date FROM daily_snapshots ORDER BY scan_date DESC")
-    dates = [row[0] for row in cursor.fetchall()]
-    conn.close()
-    return dates
+    conn = snapshot_connection(readonly=True)
+    cursor = conn.execute("SELECT DISTINCT scan_date FROM daily_snapshots ORDER BY scan_date DESC")
+    return [row[0] for row in cursor.fetchall()]
+
+def _snapshot_select(columns=None):
+    """SELECT list for scan result columns (all of SNAPSHOT_COLUMNS by default)."""
+    by_name = {column: name for name, (column, _) in SNAPSHOT_COLUMNS.items()}
+    columns = list(by_name) if columns is None else list(columns)
+    unknown = [c for c in columns if c not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown snapshot columns: {unknown}")
+    return ", ".join(f"{by_name[c]} AS '{c}'" for c in columns)
 
 def load_snapshot_by_date(scan_date):
     """Retrieve full dataset for a specific date."""
     if not os.path.exists(SNAPSHOT_DB):
         return pd.DataFrame()
     
-    conn = sqlite3.connect(SNAPSHOT_DB)
-    query = """
-        SELECT 
-            ticker as 'Ticker',
-            name as 'Name',
-            themes as 'Themes',
-            overall_rank as 'Overall Rank',
-            rank_ytd as 'Rank YTD%',
-            rank_5d as 'Rank 5D%',
-            rank_turnover_ratio as 'Rank Turnover Ratio',
-            rank_20d_vol as 'Rank 20d Vol',
-            gics_sector as 'GICS Sector',
-            gics_industry as 'GICS Industry',
-            gics_sub_industry as 'GICS Sub-Industry',
-            current_price as 'Current Price',
-            latest_turnover as 'Latest Turnover',
-            avg_daily_turnover_20d as 'Avg Daily Turnover (20d)',
-            turnover_ratio as 'Turnover Ratio',
-            ytd_performance as 'YTD Performance (%)',
-            five_day_performance as '5-Day Performance (%)'
+    conn = snapshot_connection(readonly=True)
+    query = f"""
+        SELECT {_snapshot_select()}
         FROM daily_snapshots
         WHERE scan_date = ?
         ORDER BY overall_rank
     """
-    df = pd.read_sql_query(query, conn, params=(str(scan_date),))
-    conn.close()
-    return df
+    return pd.read_sql_query(query, conn, params=(str(scan_date),))
+
+def load_ticker_history(ticker, start_date=None, end_date=None, columns=None):
+    """
+    One ticker's snapshots between start_date and end_date (inclusive, open if None),
+    oldest first, as 'Scan Date' plus `columns` (scan result names, default all).
+    Asking for 'Overall Rank' only is answered from an index alone.
+    """
+    if not os.path.exists(SNAPSHOT_DB):
+        return pd.DataFrame()
+    
+    conn = snapshot_connection(readonly=True)
+    query = f"""
+        SELECT scan_date AS 'Scan Date', {_snapshot_select(columns)}
+        FROM daily_snapshots
+        WHERE ticker = ? AND scan_date >= ? AND scan_date <= ?
+        ORDER BY scan_date
+    """
+    params = (ticker, str(start_date or ''), str(end_date or '9999-12-31'))
+    return pd.read_sql_query(query, conn, params=params)
+
+def load_snapshot_range(start_date, end_date, tickers=None, columns=None):
+    """
+    Snapshots of every date between start_date and end_date (inclusive), optionally
+    only for `tickers`, as 'Scan Date' plus `columns` (default all), ordered by date
+    and Overall Rank.
+    """
+    if not os.path.exists(SNAPSHOT_DB):
+        return pd.DataFrame()
+    
+    conn = snapshot_connection(readonly=True)
+    params = [str(start_date), str(end_date)]
+    ticker_filter = ""
+    if tickers is not None:
+        tickers = list(tickers)
+        if not tickers:
+            return pd.DataFrame()
+        ticker_filter = f"AND ticker IN ({', '.join(['?'] * len(tickers))})"
+        params += tickers
+    query = f"""
+        SELECT scan_date AS 'Scan Date', {_snapshot_select(columns)}
+        FROM daily_snapshots
+        WHERE scan_date >= ? AND scan_date <= ? {ticker_filter}
+        ORDER BY scan_date, overall_rank
+    """
+    return pd.read_sql_query(query, conn, params=params)
+
+def get_top_movers(from_date, to_date, n=20, improved=True):
+    """
+    The n tickers whose Overall Rank improved most (or, with improved=False, fell
+    most) from from_date to to_date. Returns Ticker, From Rank, To Rank and Rank
+    Change (positive = moved up). Both dates are read from the covering indexes.
+    """
+    if not os.path.exists(SNAPSHOT_DB):
+        return pd.DataFrame()
+    
+    conn = snapshot_connection(readonly=True)
+    query = f"""
+        SELECT a.ticker AS 'Ticker',
+               a.overall_rank AS 'From Rank',
+               b.overall_rank AS 'To Rank',
+               a.overall_rank - b.overall_rank AS 'Rank Change'
+        FROM daily_snapshots a
+        JOIN daily_snapshots b ON b.ticker = a.ticker AND b.scan_date = ?
+        WHERE a.scan_date = ? AND a.overall_rank IS NOT NULL AND b.overall_rank IS NOT NULL
+        ORDER BY 4 {'DESC' if improved else 'ASC'}, 3, 1
+        LIMIT ?
+    """
+    return pd.read_sql_query(query, conn, params=(str(to_date), str(from_date), int(n)))
 
 def get_latest_snapshot_date():
     """Get the most recent snapshot date."""
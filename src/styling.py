@@ -0,0 +1,127 @@
+"""
+Precomputed cell colours and paginated rendering for the scan table and leaderboards.
+
+Styler.background_gradient pushes every cell through a matplotlib colormap on
+every rerun. Here each styled column is reduced once per scan to a uint8 colour
+bucket; styling a table is then a palette lookup for the rows actually shown,
+and the main table is paginated so only the visible page is styled and sent.
+"""
+import functools
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+N_BUCKETS = 64
+NO_COLOR = 255                # bucket for missing values (left unstyled)
+TEXT_COLOR_THRESHOLD = 0.408  # same dark/light text switch as Styler.background_gradient
+
+# Column -> (colormap, vmin, vmax). None takes the bound from the data, per column.
+TABLE_GRADIENTS = {
+    'YTD Performance (%)': ('RdYlGn', None, None),
+    '5-Day Performance (%)': ('RdYlGn', None, None),
+    'Turnover Ratio': ('Oranges', 0.5, 3.0),
+    'Avg Daily Turnover (20d)': ('Blues', 0, 500_000_000),  # raw $, shown in $M
+    'Overall Rank': ('RdYlGn_r', 1, 100),  # reversed because 1 is better
+}
+LEADERBOARD_GRADIENTS = {
+    'YTD Performance (%)': ('RdYlGn', None, None),
+    '5-Day Performance (%)': ('RdYlGn', None, None),
+    'Turnover Ratio': ('Oranges', 0.5, 2.5),
+    'Latest Turnover': ('Blues', 0, 500),  # leaderboards already hold $M
+    'Overall Rank': ('RdYlGn_r', 1, 10),
+}
+
+PAGE_SIZES = [50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _palette(cmap):
+    """CSS for each bucket of a colormap (plus an empty entry at NO_COLOR)."""
+    import matplotlib
+    colormap = matplotlib.colormaps.get_cmap(cmap)
+    css = []
+    for rgba in colormap(np.linspace(0, 1, N_BUCKETS)):
+        r, g, b = (x / 12.92 if x <= 0.04045 else ((x + 0.055) / 1.055) ** 2.4 for x in rgba[:3])
+        dark = 0.2126 * r + 0.7152 * g + 0.0722 * b < TEXT_COLOR_THRESHOLD
+        css.append(f"background-color: {matplotlib.colors.rgb2hex(rgba)};color: {'#f1f1f1' if dark else '#000000'};")
+    css += [""] * (NO_COLOR + 1 - N_BUCKETS)
+    return np.array(css, dtype=object)
+
+
+def color_buckets(df, gradients):
+    """uint8 colour bucket per cell of each gradient column present in df (same index)."""
+    buckets = {}
+    for col, (cmap, vmin, vmax) in gradients.items():
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=float)
+        codes = np.full(len(values), NO_COLOR, dtype=np.uint8)
+        valid = ~np.isnan(values)
+        if valid.any():
+            lo = np.min(values[valid]) if vmin is None else vmin
+            hi = np.max(values[valid]) if vmax is None else vmax
+            scaled = (values[valid] - lo) / (hi - lo) if hi > lo else np.zeros(valid.sum())
+            codes[valid] = np.clip(np.round(scaled * (N_BUCKETS - 1)), 0, N_BUCKETS - 1)
+        buckets[col] = codes
+    return pd.DataFrame(buckets, index=df.index)
+
+
+def cached_color_buckets(df, gradients):
+    """color_buckets, cached by the content of the styled columns (theme edits keep the entry)."""
+    columns = [c for c in gradients if c in df.columns]
+    digest = hashlib.sha1(repr(sorted(gradients.items())).encode())
+    digest.update(pd.util.hash_pandas_object(df[columns], index=True).to_numpy().tobytes())
+    key = digest.hexdigest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    buckets = color_buckets(df, gradients)
+    with _cache_lock:
+        _cache[key] = buckets
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return buckets
+
+
+def style_frame(df, buckets, gradients):
+    """Styler for df (any subset of the rows buckets was computed for) using the precomputed colours."""
+    columns = [c for c in gradients if c in df.columns and c in buckets.columns]
+    codes = buckets.loc[df.index, columns]
+
+    def colors(data):
+        return pd.DataFrame({c: _palette(gradients[c][0])[codes[c].to_numpy()] for c in columns}, index=data.index)
+
+    return df.style.apply(colors, axis=None, subset=columns)
+
+
+def paginate(df, key, default_size=DEFAULT_PAGE_SIZE):
+    """Renders page controls and returns the rows of df on the current page."""
+    size_col, page_col, info_col = st.columns([1, 1, 4])
+    with size_col:
+        size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(default_size), key=f"{key}_page_size")
+    pages = max(1, math.ceil(len(df) / size))
+    page_key = f"{key}_page"
+    # The page lives only in session state (no widget default), so it can be clamped here
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+    elif st.session_state[page_key] > pages:
+        # Filters shrank the table below the remembered page
+        st.session_state[page_key] = pages
+    with page_col:
+        page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    start = (page - 1) * size
+    end = min(start + size, len(df))
+    with info_col:
+        st.caption(f"Rows {start + 1 if len(df) else 0}–{end} of {len(df)}")
+    return df.iloc[start:end]
@@ -0,0 +1,133 @@
+"""
+User theme parsing and the theme index used for filtering the scan table.
+
+Themes are stored as one comma-separated string per stock ("AI, Cloud"). The
+index maps each theme to the row positions carrying it and each ticker to its
+theme set, so the filter options come straight from the index and filtering is
+an exact set lookup instead of a substring test per row.
+"""
+import numpy as np
+import pandas as pd
+
+THEME_SEPARATOR = ", "
+
+
+def parse_themes(value):
+    """Themes of one cell as a list: split on commas, trimmed, blanks and repeats dropped."""
+    if not isinstance(value, str):
+        return []
+    themes = []
+    for theme in value.split(','):
+        theme = theme.strip()
+        if theme and theme not in themes:
+            themes.append(theme)
+    return themes
+
+
+def explode_themes(values):
+    """
+    Vectorized parse_themes over a Series: one row per (cell, theme), indexed by the
+    cell's position in `values`.
+    """
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    exploded = values.str.split(',').explode().str.strip()
+    exploded = exploded[exploded.notna() & (exploded != "")]
+    repeated = pd.DataFrame({'row': exploded.index, 'theme': exploded.to_numpy()}).duplicated().to_numpy()
+    return exploded[~repeated]
+
+
+class ThemeIndex:
+    """
+    Inverted index over the Themes column of a scan table.
+
+    `positions` maps theme -> set of row positions, `ticker_themes` maps ticker ->
+    set of themes. Positions refer to the frame the index was built from.
+    """
+    def __init__(self, tickers, themes):
+        self.tickers = np.asarray(tickers, dtype=object)
+        self.ticker_position = {t: i for i, t in enumerate(self.tickers)}
+        self.positions = {}
+        self.ticker_themes = {t: set() for t in self.tickers}
+        exploded = explode_themes(themes)
+        for position, theme in zip(exploded.index, exploded):
+            self.positions.setdefault(theme, set()).add(position)
+            self.ticker_themes[self.tickers[position]].add(theme)
+
+    @classmethod
+    def from_frame(cls, df):
+        if df.empty or 'Themes' not in df.columns:
+            return cls(df['Ticker'] if 'Ticker' in df.columns else [], [])
+        return cls(df['Ticker'].to_numpy(), df['Themes'])
+
+    def matches(self, df):
+        """True if the index was built over this frame's rows (same tickers, same order)."""
+        return len(df) == len(self.tickers) and (df.empty or np.array_equal(df['Ticker'].to_numpy(dtype=object), self.tickers))
+
+    @property
+    def themes(self):
+        """Sorted list of themes in use (the filter options)."""
+        return sorted(self.positions)
+
+    def themes_of(self, ticker):
+        return self.ticker_themes.get(ticker, set())
+
+    def lookup(self, selected):
+        """Sorted row positions of stocks carrying any of the selected themes."""
+        hits = set()
+        for theme in selected:
+            hits |= self.positions.get(theme, set())
+        return np.fromiter(sorted(hits), dtype=np.int64, count=len(hits))
+
+    def update(self, ticker, value):
+        """Re-indexes one ticker after its Themes cell was edited to `value`."""
+        position = self.ticker_position.get(ticker)
+        if position is None:
+            return
+        new = set(parse_themes(value))
+        old = self.ticker_themes[ticker]
+        for theme in old - new:
+            rows = self.positions[theme]
+            rows.discard(position)
+            if not rows:
+                del self.positions[theme]
+        for theme in new - old:
+            self.positions.setdefault(theme, set()).add(position)
+        self.ticker_themes[ticker] = new
+
+
+def diff_themes(before, after):
+    """
+    {ticker: new Themes} for rows whose Themes differ between two frames with the
+    same rows in the same order (missing and empty count as equal).
+    """
+    old = before['Themes'].fillna("").to_numpy(dtype=object)
+    new = after['Themes'].fillna("").to_numpy(dtype=object)
+    changed = old != new
+    return dict(zip(after['Ticker'].to_numpy()[changed], after['Themes'].to_numpy(dtype=object)[changed]))
+
+
+def stage_theme_edits(staged, before, after):
+    """
+    Staged edits ({ticker: Themes}, across pages) updated with the edits of one page:
+    the page's tickers are replaced by diff_themes(before, after), so an edit changed
+    back to its original value is dropped. `staged` itself is not modified.
+    """
+    page = set(before['Ticker'])
+    out = {ticker: themes for ticker, themes in staged.items() if ticker not in page}
+    out.update(diff_themes(before, after))
+    return out
+
+
+def with_themes(df, overrides):
+    """
+    df with the Themes of the tickers in `overrides` ({ticker: Themes}) replaced.
+    df itself is never modified: the result is a shallow copy with a new Themes column.
+    """
+    if not overrides:
+        return df
+    themes = df['Themes'].to_numpy(dtype=object).copy()
+    rows = df['Ticker'].isin(list(overrides)).to_numpy()
+    themes[rows] = df['Ticker'][rows].map(overrides).to_numpy(dtype=object)
+    out = df.copy(deep=False)
+    out['Themes'] = themes
+    return out
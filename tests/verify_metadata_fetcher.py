@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from metadata_fetcher import fetch_infos, http_json_fetcher
+
+# Local stub of the summary endpoint: throttles (429) whenever more than
+# MAX_PARALLEL requests are in flight, and fails every ticker's first attempt with 401.
+MAX_PARALLEL = 6
+lock = threading.Lock()
+state = {'in_flight': 0, 'seen': set(), 'throttled': 0}
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        ticker = self.path.strip('/')
+        with lock:
+            state['in_flight'] += 1
+            busy = state['in_flight'] > MAX_PARALLEL
+            first = ticker not in state['seen']
+            state['seen'].add(ticker)
+        try:
+            time.sleep(0.05)
+            if busy or first:
+                state['throttled'] += 1
+                self.send_response(429 if busy else 401)
+                self.end_headers()
+                return
+            body = json.dumps({'longBusinessSummary': f"{ticker} does things", 'industry': 'Stub'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with lock:
+                state['in_flight'] -= 1
+
+    def log_message(self, *args):
+        pass
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+tickers = [f"T{i:03d}" for i in range(100)]
+start = time.time()
+results, failed = fetch_infos(tickers, fetch=http_json_fetcher(base_url), rate=50, burst=10)
+elapsed = time.time() - start
+server.shutdown()
+
+print(f"Fetched {len(results)} / {len(tickers)} in {elapsed:.1f}s, stub sent {state['throttled']} errors")
+print(f"Failed: {failed}")
+print(f"All summaries correct: {all(results[t]['industry'] == 'Stub' for t in results)}")
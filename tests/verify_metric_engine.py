@@ -0,0 +1,86 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import datetime
+import numpy as np
+import pandas as pd
+from data import compute_metrics
+from storage import load_metadata, load_market_data, load_market_panel
+
+# Compare the vectorized engine against the per-ticker loop it replaced
+market_data = load_market_data()
+metadata = load_metadata()
+reference_date = datetime.date.today()
+start_of_year = datetime.date(reference_date.year, 1, 1)
+
+df = compute_metrics(load_market_panel(), metadata, reference_date).set_index('Ticker')
+print(f"Engine returned {len(df)} tickers")
+
+mismatches = 0
+for ticker in df.index[:50]:
+    group = market_data[market_data['Ticker'] == ticker].sort_values('Date')
+    last_20 = group.tail(20)
+    avg_turnover = last_20['Turnover'].mean() if len(last_20) >= 20 else 0
+    prev_year = group[pd.to_datetime(group['Date']) < pd.Timestamp(start_of_year)]
+    ytd = None
+    if not prev_year.empty:
+        base = prev_year.iloc[-1]['Close']
+        ytd = (group.iloc[-1]['Close'] - base) / base * 100
+    perf_5d = 0.0
+    if len(group) >= 6:
+        perf_5d = (group.iloc[-1]['Close'] - group.iloc[-6]['Close']) / group.iloc[-6]['Close'] * 100
+
+    row = df.loc[ticker]
+    expected = [group.iloc[-1]['Close'], avg_turnover, perf_5d]
+    actual = [row['Current Price'], row['Avg Daily Turnover (20d)'], row['5-Day Performance (%)']]
+    # Turnover is stored as float32, so turnover metrics match the float64 reference only to ~1e-7
+    ok = all((pd.isna(a) and pd.isna(e)) or np.isclose(a, e, rtol=1e-6) for a, e in zip(actual, expected))
+    ok = ok and ((ytd is None and pd.isna(row['YTD Performance (%)'])) or np.isclose(row['YTD Performance (%)'], ytd, rtol=1e-6))
+    if not ok:
+        mismatches += 1
+        print(f"MISMATCH {ticker}: expected {expected + [ytd]}, got {actual + [row['YTD Performance (%)']]}")
+
+print(f"Mismatches: {mismatches}")
+
+# The windowed scan must equal the full-panel scan on data with gaps
+import tempfile
+from data import scan_market_data, add_ranks
+from storage import save_market_data
+
+os.chdir(tempfile.mkdtemp())  # all data paths are relative to the working directory
+rng = np.random.default_rng(0)
+dates = pd.bdate_range('2025-09-01', '2026-06-30')
+frames = []
+for i in range(40):
+    d = dates
+    if i % 5 == 1:
+        d = d[rng.random(len(d)) > 0.5]               # holes: fewer than 20 bars in the recent window
+    if i % 5 == 2:
+        d = d[d < pd.Timestamp('2026-03-01')]         # stopped updating
+    if i % 5 == 3:
+        d = d[(d < pd.Timestamp('2025-12-20')) | (d > pd.Timestamp('2026-01-05'))]  # no bar around year end
+    if i % 5 == 4:
+        d = d[d > pd.Timestamp('2026-06-10')]         # listed recently
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(d))))
+    volume = rng.integers(100_000, 10_000_000, len(d)).astype(float)
+    frames.append(pd.DataFrame({'Date': d.date, 'Ticker': f"G{i:02d}", 'Close': close,
+                                'Volume': volume, 'Turnover': close * volume}))
+save_market_data(pd.concat(frames, ignore_index=True))
+gap_metadata = pd.DataFrame({'Symbol': [f"G{i:02d}" for i in range(40)], 'Security': 'Co', 'Smart Tags': '',
+                             'GICS Sector': 'S', 'GICS Industry': 'I', 'GICS Sub-Industry': 'SI'})
+
+panel = load_market_panel()
+gap_mismatches = 0
+# Live scan (data older than any fixed lookback), early January and a date with recent listings
+for as_of in [None, datetime.date(2026, 1, 7), datetime.date(2026, 6, 15)]:
+    reference = as_of or datetime.date.today()
+    windowed = scan_market_data(gap_metadata, as_of).sort_values('Ticker').reset_index(drop=True)
+    full = add_ranks(compute_metrics(panel, gap_metadata, reference, as_of)).sort_values('Ticker').reset_index(drop=True)
+    try:
+        # Both sides read the same stored bars, so metrics and ranks must match exactly
+        pd.testing.assert_frame_equal(windowed, full, check_exact=True)
+    except AssertionError as e:
+        gap_mismatches += 1
+        print(f"MISMATCH windowed scan as of {as_of}: {e}")
+print(f"Windowed scan mismatches: {gap_mismatches}")
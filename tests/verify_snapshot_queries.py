@@ -0,0 +1,44 @@
+import sys
+import os
+import tempfile
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+import storage
+
+# Work on a throwaway database
+storage.SNAPSHOT_DB = os.path.join(tempfile.mkdtemp(), "snapshots.db")
+
+rng = np.random.default_rng(0)
+tickers = [f"T{i:03d}" for i in range(200)]
+dates = [str(d) for d in pd.bdate_range('2025-01-06', periods=30).date]
+frames = [pd.DataFrame({'Scan Date': d, 'Ticker': tickers, 'Overall Rank': rng.permutation(len(tickers)) + 1,
+                        'YTD Performance (%)': rng.normal(size=len(tickers))}) for d in dates]
+snapshots = pd.concat(frames, ignore_index=True)
+assert storage.save_snapshots(snapshots) == len(snapshots)
+
+history = storage.load_ticker_history('T007', dates[10], dates[19], columns=['Overall Rank'])
+expected = snapshots[(snapshots['Ticker'] == 'T007') & snapshots['Scan Date'].between(dates[10], dates[19])]
+assert list(history['Scan Date']) == dates[10:20]
+assert list(history['Overall Rank']) == list(expected['Overall Rank'])
+
+window = storage.load_snapshot_range(dates[-3], dates[-1], tickers=['T001', 'T002'])
+assert len(window) == 6 and set(window['Ticker']) == {'T001', 'T002'}
+
+movers = storage.get_top_movers(dates[0], dates[-1], n=5)
+before = frames[0].set_index('Ticker')['Overall Rank']
+after = frames[-1].set_index('Ticker')['Overall Rank']
+change = (before - after).sort_values(ascending=False)
+print(movers)
+assert list(movers['Rank Change']) == list(change.head(5))
+assert (movers['From Rank'] - movers['To Rank'] == movers['Rank Change']).all()
+
+# Both the history and movers queries are answered from the covering indexes
+conn = storage.snapshot_connection(readonly=True)
+plan = conn.execute("EXPLAIN QUERY PLAN SELECT scan_date, overall_rank FROM daily_snapshots "
+                    "WHERE ticker = ? AND scan_date >= ? ORDER BY scan_date", ('T007', dates[0])).fetchall()
+print(plan)
+assert 'COVERING INDEX idx_ticker_date_rank' in str(plan)
+
+print("Snapshot queries OK")
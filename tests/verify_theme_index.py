@@ -0,0 +1,37 @@
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import numpy as np
+import pandas as pd
+from themes import ThemeIndex, parse_themes
+
+# Substring matching used to put "Cloud Security" stocks under "Cloud"; the index must not
+df = pd.DataFrame({
+    'Ticker': ['NVDA', 'WMT', 'MSFT', 'XOM', 'AMZN'],
+    'Themes': ['AI, Semis', 'Retail', 'AI,Cloud', 'Cloud Security', 'Cloud, Retail, '],
+})
+index = ThemeIndex.from_frame(df)
+print("Themes:", index.themes)
+assert index.themes == ['AI', 'Cloud', 'Cloud Security', 'Retail', 'Semis']
+assert list(df.iloc[index.lookup(['AI'])]['Ticker']) == ['NVDA', 'MSFT']
+assert list(df.iloc[index.lookup(['Cloud', 'Retail'])]['Ticker']) == ['WMT', 'MSFT', 'AMZN']
+
+# Random edits keep the index identical to a rebuild
+rng = np.random.default_rng(0)
+names = ['AI', 'Cloud', 'EV', 'Retail', 'Semis']
+df = pd.DataFrame({'Ticker': [f"T{i}" for i in range(200)],
+                   'Themes': [', '.join(rng.choice(names, rng.integers(0, 4), replace=False)) for _ in range(200)]})
+index = ThemeIndex.from_frame(df)
+for _ in range(500):
+    i = int(rng.integers(len(df)))
+    value = ', '.join(rng.choice(names, rng.integers(0, 4), replace=False))
+    df.loc[i, 'Themes'] = value
+    index.update(df.loc[i, 'Ticker'], value)
+rebuilt = ThemeIndex.from_frame(df)
+assert index.positions == rebuilt.positions and index.ticker_themes == rebuilt.ticker_themes
+
+selected = ['EV', 'Semis']
+expected = [i for i, v in enumerate(df['Themes']) if set(parse_themes(v)) & set(selected)]
+assert list(index.lookup(selected)) == expected
+print("Theme index OK")
@@ -14,6 +14,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
 from data import update_metadata, update_market_data
+from storage import load_market_manifest
 from datetime import datetime
 
 def main():
@@ -28,13 +29,15 @@ def main():
         
         # Update market data (only fetches new data since last update)
         print("Updating market data...")
-        market_data = update_market_data(tickers)
+        new_data = update_market_data(tickers)
+        manifest = load_market_manifest()
         
-        if not market_data.empty:
-            latest_date = market_data['Date'].max()
+        if manifest['dates']:
+            latest_date = manifest['dates'][-1]
             print(f"✅ Market data updated successfully!")
             print(f"   Latest date: {latest_date}")
-            print(f"   Total records: {len(market_data)}")
+            print(f"   New records: {len(new_data)}")
+            print(f"   Total records: {sum(info['rows'] for info in manifest['tickers'].values())}")
         else:
             print("⚠️ No market data available")
             